@@ -34,12 +34,13 @@
 # ├── hardware.py
 # └── plant_logging.py
 #
-# plant_logging.py : v2-2.5.1.f4 (stable) - refactor C1.0.0
+# plant_logging.py : v2-2.5.1.f5 (stable) - refactor C1.0.0
 # changelog : include a mechanism to track the last watering event and ensure it only logs "Yes" for the actual watering event
 #           : f1 fixing runtime errors
 #           : f2 added simulation logging for auto_water simulation
 #           : f3 fixed sim log
 #           : f4 added the tag (simulated) when auto_water is set to false but water should be given according to the logic.
+#           : f5 daily rotation with gzip compression on a background thread and retention
 
 import logging
 import os
@@ -47,21 +48,46 @@ import time
 
 # plant_logging_sim.py
 
+import gzip
 import logging
+import logging.handlers
 import os
+import shutil
+import threading
 import time
 
+# Rotated simulation logs are kept this many days
+LOG_RETENTION_DAYS = 14
+
 # Ensure the /var/log directory exists
 log_dir = "/var/log/plantwatch_sim"
 os.makedirs(log_dir, exist_ok=True)
 
+# Rotated segments get the date in their name (plantwatch_channel_1.log.2024-06-01.gz)
+def compressed_name(name):
+    return name + ".gz"
+
+# Rename inline, compress on a thread so logging never waits for gzip
+def compress_segment(source, dest):
+    segment = dest[:-len(".gz")]
+    os.rename(source, segment)
+
+    def compress():
+        with open(segment, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(segment)
+
+    threading.Thread(target=compress, daemon=True).start()
+
 # Function to set up logging for a specific channel
 def setup_channel_logger(channel_id):
     logger = logging.getLogger(f"Channel{channel_id}")
     logger.setLevel(logging.INFO)
     log_path = os.path.join(log_dir, f"plantwatch_channel_{channel_id}.log")
     
-    handler = logging.FileHandler(log_path)
+    handler = logging.handlers.TimedRotatingFileHandler(log_path, when="midnight", backupCount=LOG_RETENTION_DAYS)
+    handler.namer = compressed_name
+    handler.rotator = compress_segment
     handler.setLevel(logging.INFO)
     
     formatter = logging.Formatter('%(asctime)s - %(message)s')
@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+#    ___     _                                         
+#   / _ \___| |_ ___ _ __                              
+#  / /_)/ _ \ __/ _ \ '__|                             
+# / ___/  __/ ||  __/ |                                
+# \/    \___|\__\___|_|                                                                                 
+#    ___ _             _   __    __      _       _     
+#   / _ \ | __ _ _ __ | |_/ / /\ \ \__ _| |_ ___| |__  
+#  / /_)/ |/ _` | '_ \| __\ \/  \/ / _` | __/ __| '_ \ 
+# / ___/| | (_| | | | | |_ \  /\  / (_| | || (__| | | |
+# \/    |_|\__,_|_| |_|\__| \/  \/ \__,_|\__\___|_| |_|
+#                       .: auto-grow the greens yo :.                          
+#
+# Automated plant monitoring and watering system
+#
+# hardware platform  : Raspberry Pi Zero W
+# HAT                : Pimoroni Grow Hat Mini
+# Water drivers      : COM3700 Mini submersible water pump
+# Sensors            : Capacitive Soil moisture sensor with PFM output
+#                    : BME280 Temperature, Humidity, Air pressure
+#                    : LTR-559 light and proximity sensor 
+# Codebase           : Python3
+#
+# (2024) JinjiroSan
+#
+# PeterPlantwatch/
+# ├── main.py
+# ├── config.py
+# ├── views.py
+# ├── controllers.py
+# ├── models.py
+# ├── icons.py
+# ├── constants.py
+# ├── hardware.py
+# ├── plant_logging.py
+# ├── metrics.py
+# ├── scheduler.py
+# ├── buttons.py
+# └── benchmark.py
+#
+# benchmark.py : v1-1.0.f13 (stable)
+# changelog : f1 - added the display benchmark (bytes sent per frame for each view)
+#           : f2 - added the render benchmark (render time per view and sprite cache hits)
+#           : f3 - render benchmark reports text cache hits and FreeType renders per frame
+#           : f4 - added the help benchmark (render time when opening the help overlay)
+#           : f5 - added the startup benchmark (view construction, fonts loaded, time to first frame)
+#           : f6 - added the writer benchmark (loop time per frame with and without the display writer thread)
+#           : f7 - added the encode benchmark (RGB565 encode time for RGB and palette frames), views can be built on a "P" canvas
+#           : f8 - added the headless benchmark (start time and peak RSS of a headless process against a full one)
+#           : f9 - render benchmark includes a home screen with 12 channels
+#           : f10 - added the text benchmark (glyph-composed strings against FreeType, pixel comparison and miss cost)
+#           : f11 - channels beyond the three Grow HAT inputs are stubs, so the 12 channel render runs on the Pi
+#           : f12 - text benchmarks report FreeType layout calls next to renders
+#           : f13 - help benchmark presses the buttons through the channel edit view
+
+# usage : python3 benchmark.py [name ...]   (runs all benchmarks when no name is given)
+
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+
+def per_call(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations
+
+
+def report(name, seconds):
+    print(f"  {name:<40} {seconds * 1e6:10.1f} us")
+
+
+# A channel without grow hardware behind it: settings for the config benchmark
+# and the readings the home screen draws. The Grow HAT only has inputs 1-3,
+# so any channel beyond that has to be a stub.
+class StubChannel:
+    def __init__(self, channel):
+        self.channel = channel
+        self.enabled = True
+        self.active = True
+        self.alarm = False
+        self.saturation = 0.5
+        self.moisture = 4.5
+        self.warn_level = 0.2
+
+    def lut_color(self, value, step=1):
+        from models import Channel
+        return Channel.lut_color(Channel, value, step)
+
+    def to_dict(self):
+        return {
+            "enabled": True,
+            "warn_level": 0.2,
+            "wet_point": 0.7,
+            "dry_point": 26.7,
+            "watering_delay": 60,
+            "auto_water": False,
+            "pump_time": 0.2,
+            "pump_speed": 0.5,
+            "water_level": 0.5,
+        }
+
+
+def bench_config(iterations=500):
+    from config import Config
+
+    channels = [StubChannel(i) for i in range(1, 4)]
+    general = {"alarm_enable": True, "alarm_interval": 10}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        settings_file = pathlib.Path(tmp) / "settings.yml"
+        settings = {f"channel{channel.channel}": channel.to_dict() for channel in channels}
+        settings["general"] = dict(general, black_screen_when_light_low=True, light_level_low=4.0)
+        settings_file.write_text(yaml.dump(settings))
+
+        config = Config()
+        config.load(settings_file)
+
+        # What every frame used to cost: rebuild the sections and dump the whole file to compare
+        last_save = yaml.dump(config.config)
+
+        def legacy_tick():
+            for channel in channels:
+                config.config[f"channel{channel.channel}"].update(channel.to_dict())
+            config.config["general"].update(general)
+            return yaml.dump(config.config) == last_save
+
+        def tick():
+            for channel in channels:
+                config.set_channel(channel.channel, channel)
+            config.set_general(general)
+            config.save(settings_file)
+
+        print("config save, nothing changed (per tick):")
+        report("legacy set + yaml.dump compare", per_call(legacy_tick, iterations))
+        report("dirty tracked set + save", per_call(tick, iterations))
+        assert not config.dirty
+
+
+# Builds every view on one canvas the way main.py does, with enabled channels
+# and a triggered alarm so the animated parts are exercised too
+def build_views(mode="RGB"):
+    from PIL import Image
+    from constants import DISPLAY_WIDTH, DISPLAY_HEIGHT
+    from models import Channel, Alarm
+    from views import MainView, SettingsView, DetailView, ChannelEditView
+
+    image = Image.new(mode, (DISPLAY_WIDTH, DISPLAY_HEIGHT), color=(0, 0, 0))
+    channels = [Channel(i, i, i, enabled=True) for i in range(1, 4)]
+    alarm = Alarm()
+    channels[0].alarm = True
+    alarm.trigger()
+
+    options = [
+        {"title": "Alarm Interval", "prop": "interval", "inc": 1, "min": 1, "max": 60,
+         "format": lambda value: f"{value:02.0f}sec", "object": alarm, "help": "Time between alarm beeps."},
+    ]
+    views = {
+        "main": MainView(image, channels=channels, alarm=alarm),
+        "settings": SettingsView(image, options=options),
+        "detail": DetailView(image, channel=channels[0]),
+        "channel edit": ChannelEditView(image, channel=channels[0]),
+    }
+    return image, channels, alarm, views
+
+
+def simulate_readings(channels, tick):
+    # A new sample once a second, drifting slowly like real soil does
+    if tick % 10 == 0:
+        for channel in channels:
+            channel.saturation = 0.4 + 0.02 * ((tick // 10 + channel.channel) % 5)
+            channel.moisture = 4.0 + channel.saturation
+            channel.active = True
+
+
+class CountingDisplay:
+    # Stands in for the ST7735; DisplayOutput does the byte accounting.
+    # spi_speed_hz > 0 makes writes take as long as they would on the bus.
+    def __init__(self, rotation=270, spi_speed_hz=0):
+        self._rotation = rotation
+        self.spi_speed_hz = spi_speed_hz
+
+    def _transfer(self, size):
+        if self.spi_speed_hz:
+            time.sleep(size * 8 / self.spi_speed_hz)
+
+    def display(self, image):
+        self._transfer(image.size[0] * image.size[1] * 2)
+
+    def set_window(self, x0=0, y0=0, x1=None, y1=None):
+        pass
+
+    def data(self, data):
+        self._transfer(len(data))
+
+
+def bench_display(frames=30):
+    from constants import FPS
+    from framebuffer import DisplayOutput
+
+    image, channels, alarm, views = build_views()
+    full = image.size[0] * image.size[1] * 2
+
+    print(f"display bytes per frame ({frames} frames at {FPS} fps, full frame = {full} bytes):")
+    for name, view in views.items():
+        output = DisplayOutput(CountingDisplay())
+        for tick in range(frames):
+            simulate_readings(channels, tick)
+            view.update()
+            view.render()
+            output.push(image)
+            time.sleep(1.0 / FPS)
+        print(f"  {name:<14} {output.bytes_sent / frames:9.0f} bytes/frame  "
+              f"full {output.pushed:3d}  partial {output.partial:3d}  skipped {output.skipped:3d}")
+
+
+def bench_writer(frames=60, spi_speed_hz=4000000):
+    import metrics
+    from constants import FPS
+    from framebuffer import DisplayOutput, DisplayWriter
+
+    image, channels, alarm, views = build_views()
+    view = views["detail"]
+
+    print(f"time the loop spends sending a frame ({frames} frames at {FPS} fps, {spi_speed_hz / 1e6:.0f} MHz SPI):")
+    output = DisplayOutput(CountingDisplay(spi_speed_hz=spi_speed_hz))
+    elapsed = 0.0
+    for tick in range(frames):
+        simulate_readings(channels, tick)
+        view.update()
+        view.render()
+        start = time.perf_counter()
+        output.push(image)
+        elapsed += time.perf_counter() - start
+        time.sleep(1.0 / FPS)
+    report("push on the loop", elapsed / frames)
+
+    writer = DisplayWriter(DisplayOutput(CountingDisplay(spi_speed_hz=spi_speed_hz)))
+    writer.start()
+    elapsed = 0.0
+    for tick in range(frames):
+        simulate_readings(channels, tick)
+        view.update()
+        view.render()
+        start = time.perf_counter()
+        writer.submit(image)
+        elapsed += time.perf_counter() - start
+        time.sleep(1.0 / FPS)
+    writer.stop()
+    report("submit to writer thread", elapsed / frames)
+    transfer = metrics.stat("display.transfer_ms")
+    print(f"  writer: {writer.sent} sent, {writer.dropped} dropped, transfer {transfer.mean:.2f} ms mean, {transfer.max:.2f} ms max")
+
+
+def bench_encode(frames=200):
+    import numpy
+    from PIL import Image
+    from framebuffer import DisplayOutput, encode, palette565
+
+    def st7735(image):
+        # What the ST7735 driver's image_to_data() does for every frame
+        pb = numpy.rot90(numpy.array(image.convert("RGB")), 3).astype("uint16")
+        color = ((pb[:, :, 0] & 0xF8) << 8) | ((pb[:, :, 1] & 0xFC) << 3) | (pb[:, :, 2] >> 3)
+        return numpy.dstack(((color >> 8) & 0xFF, color & 0xFF)).flatten().tolist()
+
+    def rgb(image):
+        return encode(numpy.rot90(numpy.asarray(image), 3))
+
+    tables = {}
+
+    def palette(image):
+        # The table is only rebuilt when the palette changes, as in DisplayOutput
+        colors = image.getpalette()
+        table = tables.get("table") if tables.get("palette") == colors else None
+        if table is None:
+            table = tables["table"] = palette565(colors)
+            tables["palette"] = colors
+        return encode(numpy.rot90(numpy.asarray(image), 3), table)
+
+    print(f"RGB565 encode time per full frame ({frames} frames):")
+    for name, mode, func in (("st7735 image_to_data", "RGB", st7735), ("numpy RGB", "RGB", rgb), ("palette P", "P", palette)):
+        image, channels, alarm, views = build_views(mode)
+        views["detail"].render()
+        start = time.perf_counter()
+        for _ in range(frames):
+            func(image)
+        report(name, (time.perf_counter() - start) / frames)
+
+    output = DisplayOutput(CountingDisplay())
+    blank = output.constant(Image.new("RGB", image.size, color=(0, 0, 0)))
+    start = time.perf_counter()
+    for _ in range(frames):
+        output.invalidate()
+        output.push(blank)
+    report("constant frame (cached)", (time.perf_counter() - start) / frames)
+
+
+def bench_render(frames=200):
+    import views as view_module
+
+    image, channels, alarm, views = build_views()
+
+    # A node with 12 sensors, paged four at a time: only the visible page is drawn
+    many = channels + [StubChannel(i) for i in range(4, 13)]
+    views["main (12 channels)"] = view_module.MainView(image, channels=many, alarm=alarm)
+    channels = many
+
+    text = view_module.text_cache
+    steady = frames - frames // 2
+
+    print(f"render time per frame ({frames} frames):")
+    for name, view in views.items():
+        elapsed = 0.0
+        for tick in range(frames):
+            simulate_readings(channels, tick)
+            view.update()
+            if tick == frames // 2:
+                renders, layouts = text.renders, text.layouts
+            start = time.perf_counter()
+            view.render()
+            if tick >= frames // 2:  # Steady state only, caches are warm by now
+                elapsed += time.perf_counter() - start
+        report(name, elapsed / steady)
+        print(f"    freetype renders/frame: {(text.renders - renders) / steady:.2f}, "
+              f"layouts/frame: {(text.layouts - layouts) / steady:.2f}")
+
+    sprites = view_module.sprites
+    print(f"  sprite cache: {sprites.hits} hits, {sprites.misses} misses, {len(sprites._sprites)} cached")
+    print(f"  text cache: {text.hits} hits, {text.misses} misses, {len(text._strings)} cached, "
+          f"glyphs {text.glyph_hits} hits, {text.glyph_misses} misses")
+
+
+def bench_help(rounds=20):
+    import views as view_module
+
+    image, channels, alarm, views = build_views()
+    view = views["channel edit"]
+    options = len(view._options)
+
+    print(f"help overlay render time ({rounds} rounds over {options} options):")
+    times = []
+    for round in range(rounds):
+        for option in range(options):
+            view.button_a()  # Open help
+            start = time.perf_counter()
+            view.render()
+            times.append(time.perf_counter() - start)
+            view.button_a()  # Close help and move on to the next option
+            view.button_b()
+        if round == 0:
+            report("first open (cold)", max(times))
+            times = []
+
+    report("open (mean)", sum(times) / len(times))
+    report("open (worst)", max(times))
+    layouts = view_module.layouts
+    print(f"  layout cache: {layouts.hits} hits, {layouts.misses} misses")
+
+
+def bench_text(sizes=(10, 14, 18)):
+    # Digit strings are composed from cached glyphs; they have to match FreeType pixel for pixel
+    from PIL import Image, ImageDraw
+    from fonts.ttf import RobotoMedium
+    import views as view_module
+
+    strings = [str(i) for i in range(100)] + [f"{i * 0.37:.2f}%" for i in range(100)]
+    strings += ["Sat: 45.20%", "Now: 0.00%", "Alarm Level : 50.00%", "Watering Delay 60sec", "1/3"]
+
+    print(f"text ({len(strings)} strings, sizes {', '.join(map(str, sizes))}):")
+    mismatches = 0
+    composed = 0.0
+    rendered = 0.0
+    layouts = 0
+    for size in sizes:
+        font = view_module.fonts.get(RobotoMedium, size)
+        cache = view_module.TextCache(maxsize=len(strings))
+        for text in strings:
+            reference = Image.new("L", (200, 30))
+            ImageDraw.Draw(reference).text((4, 4), text, font=font, fill=255)
+            image = Image.new("L", (200, 30))
+            cache.draw(image, (4, 4), text, font, 255)
+            mismatches += reference.tobytes() != image.tobytes()
+
+            before = cache.layouts
+            start = time.perf_counter()
+            cache._compose(font, text)
+            composed += time.perf_counter() - start
+            layouts += cache.layouts - before
+            start = time.perf_counter()
+            cache._render(font, text)
+            rendered += time.perf_counter() - start
+
+    count = len(strings) * len(sizes)
+    report("cache miss, composed from glyphs", composed / count)
+    report("cache miss, FreeType render", rendered / count)
+    print(f"  strings not identical to ImageDraw.text: {mismatches} of {count}")
+    print(f"  freetype layouts per composed miss, warm advances: {layouts / count:.2f}")
+
+
+def bench_startup():
+    # Run on its own ("benchmark.py startup") for a meaningful process start time
+    import metrics
+    from PIL import Image, ImageFont
+    from constants import DISPLAY_WIDTH, DISPLAY_HEIGHT
+    from fonts.ttf import RobotoMedium
+    from models import Channel, Alarm
+    import views as view_module
+    from views import MainView, SettingsView, DetailView, ChannelEditView
+
+    print("startup:")
+    start = time.perf_counter()
+    image = Image.new("RGB", (DISPLAY_WIDTH, DISPLAY_HEIGHT), color=(0, 0, 0))
+    channels = [Channel(i, i, i) for i in range(1, 4)]
+    alarm = Alarm()
+    views = [MainView(image, channels=channels, alarm=alarm), SettingsView(image, options=[])]
+    for channel in channels:
+        views += [DetailView(image, channel=channel), ChannelEditView(image, channel=channel)]
+    report(f"construct {len(views)} views + alarm", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    views[0].render()
+    report("first frame render", time.perf_counter() - start)
+    print(f"  process start to first frame: {metrics.process_uptime():.3f}s")
+    print(f"  fonts loaded: {view_module.fonts.loads}")
+
+    # What construction used to cost: every view and the alarm loaded two sizes
+    start = time.perf_counter()
+    for _ in range(len(views) + 1):
+        ImageFont.truetype(RobotoMedium, 14)
+        ImageFont.truetype(RobotoMedium, 10)
+    report(f"per-view font loads ({2 * (len(views) + 1)} loads)", time.perf_counter() - start)
+
+
+# What main.py loads in each mode; the full one also builds its views and renders a frame
+HEADLESS_PROCESS = """
+import resource, sys
+import metrics
+from models import Channel, Alarm
+from config import Config
+from context import Context, SensorFrame
+from scheduler import Scheduler
+from plant_logging import log_values
+channels = [Channel(i, i, i) for i in range(1, 4)]
+alarm = Alarm()
+"""
+
+FULL_PROCESS = HEADLESS_PROCESS + """
+from PIL import Image
+from constants import DISPLAY_WIDTH, DISPLAY_HEIGHT
+from views import MainView, SettingsView, DetailView, ChannelEditView
+from controllers import ViewController
+from framebuffer import DisplayOutput, DisplayWriter
+image = Image.new("RGB", (DISPLAY_WIDTH, DISPLAY_HEIGHT), color=(0, 0, 0))
+views = [MainView(image, channels=channels, alarm=alarm), SettingsView(image, options=[])]
+for channel in channels:
+    views += [DetailView(image, channel=channel), ChannelEditView(image, channel=channel)]
+views[0].render()
+"""
+
+REPORT_PROCESS = """
+loaded = [name for name in ("PIL", "numpy", "views", "icons", "fonts.ttf") if name in sys.modules]
+print(metrics.process_uptime(), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, ",".join(loaded))
+"""
+
+
+def bench_headless(runs=5):
+    print("headless:")
+    here = pathlib.Path(__file__).resolve().parent
+    results = {}
+    for mode, script in (("headless", HEADLESS_PROCESS), ("full", FULL_PROCESS)):
+        samples = []
+        for _ in range(runs):
+            result = subprocess.run(
+                [sys.executable, "-c", script + REPORT_PROCESS],
+                cwd=here, capture_output=True, text=True, check=True,
+            )
+            uptime, rss, loaded = (result.stdout.strip().splitlines()[-1].split(" ") + [""])[:3]
+            samples.append((float(uptime), int(rss)))
+        uptime = min(sample[0] for sample in samples)
+        rss = min(sample[1] for sample in samples)
+        results[mode] = (uptime, rss)
+        print(f"  {mode:<8} start {uptime * 1000:7.1f}ms  peak RSS {rss / 1024:6.1f}MB  loaded: {loaded or '-'}")
+
+    headless, full = results["headless"], results["full"]
+    print(f"  headless saves {(full[0] - headless[0]) * 1000:.1f}ms and {(full[1] - headless[1]) / 1024:.1f}MB")
+
+
+BENCHMARKS = {
+    "config": bench_config,
+    "display": bench_display,
+    "writer": bench_writer,
+    "encode": bench_encode,
+    "render": bench_render,
+    "help": bench_help,
+    "text": bench_text,
+    "startup": bench_startup,
+    "headless": bench_headless,
+}
+
+
+def main(names):
+    # Config treats sys.argv[1] as the settings file, keep it out of the way
+    del sys.argv[1:]
+    for name in names or BENCHMARKS:
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+#    ___     _                                         
+#   / _ \___| |_ ___ _ __                              
+#  / /_)/ _ \ __/ _ \ '__|                             
+# / ___/  __/ ||  __/ |                                
+# \/    \___|\__\___|_|                                                                                 
+#    ___ _             _   __    __      _       _     
+#   / _ \ | __ _ _ __ | |_/ / /\ \ \__ _| |_ ___| |__  
+#  / /_)/ |/ _` | '_ \| __\ \/  \/ / _` | __/ __| '_ \ 
+# / ___/| | (_| | | | | |_ \  /\  / (_| | || (__| | | |
+# \/    |_|\__,_|_| |_|\__| \/  \/ \__,_|\__\___|_| |_|
+#                       .: auto-grow the greens yo :.                          
+#
+# Automated plant monitoring and watering system
+#
+# hardware platform  : Raspberry Pi Zero W
+# HAT                : Pimoroni Grow Hat Mini
+# Water drivers      : COM3700 Mini submersible water pump
+# Sensors            : Capacitive Soil moisture sensor with PFM output
+#                    : BME280 Temperature, Humidity, Air pressure
+#                    : LTR-559 light and proximity sensor 
+# Codebase           : Python3
+#
+# (2024) JinjiroSan
+#
+# PeterPlantwatch/
+# ├── main.py
+# ├── config.py
+# ├── views.py
+# ├── controllers.py
+# ├── models.py
+# ├── icons.py
+# ├── constants.py
+# ├── hardware.py
+# ├── plant_logging.py
+# ├── metrics.py
+# ├── scheduler.py
+# └── buttons.py
+#
+# buttons.py : v1-1.0 (stable)
+
+import queue
+import time
+from collections import namedtuple
+
+import metrics
+from constants import BUTTONS, LABELS
+
+ButtonEvent = namedtuple("ButtonEvent", ["pin", "label", "timestamp"])
+
+
+# Hands button presses from the RPi.GPIO callback thread to the main loop.
+# The callback only timestamps and enqueues; all view/alarm state is touched
+# from the main thread when the loop drains the queue.
+class ButtonQueue:
+    def __init__(self, buttons=BUTTONS, labels=LABELS, maxsize=32):
+        self._labels = dict(zip(buttons, labels))
+        self._queue = queue.Queue(maxsize)
+
+    def put(self, pin):
+        event = ButtonEvent(pin, self._labels.get(pin), time.monotonic())
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            metrics.incr("input.dropped")
+
+    def wait(self, timeout):
+        # Block until a press arrives or the timeout runs out, then return every queued event
+        try:
+            events = [self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
@@ -34,75 +34,295 @@
 # ├── hardware.py
 # └── plant_logging.py
 #
-# config.py : v2-2.5 (stable) - refactor C1.0.0
+# config.py : v2-2.5.f10 (stable) - refactor C1.0.0
+# changelog : f1 - dirty tracking with a debounced background flush and atomic writes, libyaml when available
+#           : f2 - immutable typed settings snapshot and reload when settings.yml changes on disk
+#           : f3 - options like --headless are skipped when looking for the settings file argument
+#           : f4 - optional sensor_channel and pump_channel keys per channel section
+#           : f5 - a failed write keeps the changes dirty for the next save, flushes never write at the same time
+#           : f6 - reload waits while there are unsaved edits or a write in progress
+#           : f7 - sensor_channel and pump_channel must be input numbers from 1
+#           : f8 - saving keeps the mode and owner of settings.yml
+#           : f9 - empty or non-mapping settings files and sections are rejected, the low light settings have defaults
+#           : f10 - settings sections have get(), so models are updated from the validated values
 
+import logging
+import os
 import sys
 import pathlib
+import shutil
+import tempfile
+import threading
 import yaml
 
+# Prefer the libyaml C implementation, it is an order of magnitude faster on the Pi Zero
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+def input_id(value):
+    # Moisture input and pump numbers count from 1
+    if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+        raise ValueError(f"{value!r} is not an input number")
+    value = int(value)
+    if value < 1:
+        raise ValueError(f"{value!r} is not an input number")
+    return value
+
+# Known keys per section and the type they are validated to
+CHANNEL_SETTINGS = {
+    "enabled": bool,
+    "warn_level": float,
+    "wet_point": float,
+    "dry_point": float,
+    "watering_delay": float,
+    "auto_water": bool,
+    "pump_time": float,
+    "pump_speed": float,
+    "water_level": float,
+    # Optional: which moisture input and pump the channel uses, by default its own number
+    "sensor_channel": input_id,
+    "pump_channel": input_id,
+}
+
+GENERAL_SETTINGS = {
+    "alarm_enable": bool,
+    "alarm_interval": float,
+    "black_screen_when_light_low": bool,
+    "light_level_low": float,
+}
+
+# The main loop reads these on every tick, so they always have a value
+GENERAL_DEFAULTS = {
+    "black_screen_when_light_low": False,
+    "light_level_low": 4.0,
+}
+
+# Read-only view of one settings section, validated once when it is built so
+# the main loop can use plain attribute access instead of nested dict lookups
+class SettingsSection:
+    __slots__ = ()
+    types = {}
+    defaults = {}
+
+    def __init__(self, section, values):
+        values = values or {}
+        if not isinstance(values, dict):
+            raise ValueError(f"Settings section {section} should hold key: value pairs, got {values!r}")
+        for key in values:
+            if key not in self.types:
+                logging.warning(f"Unknown setting {section}.{key} in settings file")
+
+        for key, kind in self.types.items():
+            value = values.get(key)
+            if value is None:
+                value = self.defaults.get(key)
+            else:
+                if kind is bool and not isinstance(value, bool):
+                    raise ValueError(f"Setting {section}.{key} should be true or false, got {value!r}")
+                try:
+                    value = kind(value)
+                except (TypeError, ValueError):
+                    expected = "an input number from 1" if kind is input_id else "a number"
+                    raise ValueError(f"Setting {section}.{key} should be {expected}, got {value!r}")
+            object.__setattr__(self, key, value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("Settings snapshots are read-only")
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.types}
+
+    def get(self, key, default=None):
+        # Like dict.get(), keys the file leaves out give the default, so a
+        # snapshot can be handed to update_from_yml() in place of the raw section
+        value = getattr(self, key, None)
+        return default if value is None else value
+
+class ChannelSettings(SettingsSection):
+    __slots__ = tuple(CHANNEL_SETTINGS)
+    types = CHANNEL_SETTINGS
+
+class GeneralSettings(SettingsSection):
+    __slots__ = tuple(GENERAL_SETTINGS)
+    types = GENERAL_SETTINGS
+    defaults = GENERAL_DEFAULTS
+
+class Settings:
+    __slots__ = ("general", "channels")
+
+    def __init__(self, config):
+        config = config or {}
+        object.__setattr__(self, "general", GeneralSettings("general", config.get("general")))
+        object.__setattr__(self, "channels", {
+            int(section[len("channel"):]): ChannelSettings(section, values)
+            for section, values in config.items()
+            if section.startswith("channel") and section[len("channel"):].isdigit()
+        })
+
+    def __setattr__(self, key, value):
+        raise AttributeError("Settings snapshots are read-only")
+
+    def channel(self, channel_id):
+        return self.channels.get(channel_id)
+
 class Config:
-    def __init__(self):
+    def __init__(self, save_delay=2.0):
         self.config = None
-        self._last_save = ""
-
-        self.channel_settings = [
-            "enabled",
-            "warn_level",
-            "wet_point",
-            "dry_point",
-            "watering_delay",
-            "auto_water",
-            "pump_time",
-            "pump_speed",
-            "water_level",
-        ]
-
-        self.general_settings = [
-            "alarm_enable",
-            "alarm_interval",
-            "black_screen_when_light_low",
-            "light_level_low",
-        ]
+        self.save_delay = save_delay
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()  # One settings.yml write at a time (timer and atexit flushes)
+        self._flush_timer = None
+        self._settings = None
+        self._file_state = None
 
-    def load(self, settings_file="settings.yml"):
-        if len(sys.argv) > 1:
-            settings_file = sys.argv[1]
+        self.channel_settings = list(CHANNEL_SETTINGS)
+        self.general_settings = list(GENERAL_SETTINGS)
 
-        settings_file = pathlib.Path(settings_file)
+    def _settings_path(self, settings_file):
+        # The first argument that isn't an option, so main.py --headless settings.yml works
+        args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+        if args:
+            settings_file = args[0]
+
+        return pathlib.Path(settings_file)
+
+    @property
+    def dirty(self):
+        return self._dirty
+
+    @property
+    def settings(self):
+        # Rebuilt only after a change, then swapped in with a single assignment
+        settings = self._settings
+        if settings is None:
+            with self._lock:
+                settings = self._settings = Settings(self.config)
+        return settings
+
+    def _stat(self, settings_file):
+        try:
+            stat = settings_file.stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def reload_if_changed(self, settings_file="settings.yml"):
+        # One stat() call; reload only when the file was changed by someone else.
+        # Unsaved edits are never thrown away: while they wait for their flush,
+        # or while a flush is writing, the check is simply deferred.
+        settings_file = self._settings_path(settings_file)
+        if self._dirty or self._flush_timer is not None:
+            return False
+        if not self._write_lock.acquire(blocking=False):
+            return False
+
+        try:
+            state = self._stat(settings_file)
+            if state is None or state == self._file_state:
+                return False
+
+            logging.info(f"Settings file {settings_file} changed on disk, reloading")
+            self._file_state = state  # A broken file is reported once, not on every check
+            self.load(settings_file)
+            return True
+        finally:
+            self._write_lock.release()
+
+    def load(self, settings_file="settings.yml"):
+        settings_file = self._settings_path(settings_file)
 
         if settings_file.is_file():
             try:
-                self.config = yaml.safe_load(open(settings_file))
+                with open(settings_file) as file:
+                    config = yaml.load(file, Loader=SafeLoader)
             except yaml.parser.ParserError as e:
                 raise yaml.parser.ParserError(
                     f"Error parsing settings file: {settings_file} ({e})"
                 )
+            # An empty file is what an editor or a > redirect leaves halfway through a rewrite
+            if not isinstance(config, dict):
+                raise ValueError(f"Settings file {settings_file} should hold sections, got {type(config).__name__}")
+            with self._lock:
+                Settings(config)  # Validate before swapping anything in
+                self.config = config
+                self._settings = None
+                self._dirty = False
+                self._file_state = self._stat(settings_file)
 
     def save(self, settings_file="settings.yml"):
-        if len(sys.argv) > 1:
-            settings_file = sys.argv[1]
+        # Cheap when nothing changed; otherwise arm a single background flush
+        # so bursts of changes (e.g. holding ++ in an edit view) coalesce into one write
+        if not self._dirty:
+            return
 
-        settings_file = pathlib.Path(settings_file)
+        with self._lock:
+            if self._flush_timer is not None:
+                return
+            self._flush_timer = threading.Timer(self.save_delay, self.flush, args=[settings_file])
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
 
-        dump = yaml.dump(self.config)
+    def flush(self, settings_file="settings.yml"):
+        settings_file = self._settings_path(settings_file)
 
-        if dump == self._last_save:
-            return
+        with self._write_lock:
+            with self._lock:
+                self._flush_timer = None
+                if not self._dirty:
+                    return
+                dump = yaml.dump(self.config, Dumper=SafeDumper)
+                self._dirty = False
 
-        if settings_file.is_file():
-            with open(settings_file, "w") as file:
-                file.write(dump)
+            if not settings_file.is_file():
+                return
+            try:
+                self._write_atomic(settings_file, dump)
+            except OSError as e:
+                # Still dirty, so the next save() tries again
+                with self._lock:
+                    self._dirty = True
+                logging.error(f"Unable to save settings to {settings_file}: {e}")
+                return
+
+            # Recorded before the write lock is released, so our own write is never reloaded
+            self._file_state = self._stat(settings_file)
 
-        self._last_save = dump
+    def _write_atomic(self, settings_file, dump):
+        # Write to a temp file in the same directory and rename it over the
+        # original, so a power cut never leaves a half written settings.yml
+        fd, tmp_path = tempfile.mkstemp(dir=settings_file.parent, prefix=f".{settings_file.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as file:
+                file.write(dump)
+                file.flush()
+                os.fsync(file.fileno())
+            # mkstemp creates 0600; keep the mode and owner settings.yml had so others can still edit it
+            shutil.copymode(settings_file, tmp_path)
+            stat = settings_file.stat()
+            try:
+                os.chown(tmp_path, stat.st_uid, stat.st_gid)
+            except OSError:
+                pass  # Only root can give a file away, the mode is what matters
+            os.replace(tmp_path, settings_file)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
 
     def get_channel(self, channel_id):
         return self.config.get(f"channel{channel_id}", {})
 
     def set(self, section, settings):
         if isinstance(settings, dict):
-            if section not in self.config:
-                self.config[section] = {}
-            self.config[section].update(settings)
+            with self._lock:
+                current = self.config.setdefault(section, {})
+                for key, value in settings.items():
+                    if key not in current or current[key] != value:
+                        current[key] = value
+                        self._dirty = True
+                        self._settings = None
         else:
             raise ValueError("Settings should be a dictionary")
 
@@ -34,13 +34,58 @@
 # ├── hardware.py
 # └── plant_logging.py
 #
-# constants.py : v2-2.5 (stable) - refactor C1.0.0
+# constants.py : v2-2.5.f8 (stable) - refactor C1.0.0
+# changelog : f1 - added per-task intervals for the scheduler
+#           : f2 - added the settings file reload interval
+#           : f3 - added log heartbeat and deadbands
+#           : f4 - added log writer queue settings
+#           : f5 - added log rotation and retention settings
+#           : f6 - added the render mode of the canvas
+#           : f7 - added how long a button press wakes the panel in dark mode
+#           : f8 - added the idle render rate and how long input keeps the full rate
 
 DISPLAY_WIDTH = 160
 DISPLAY_HEIGHT = 80
 
 FPS = 10
 
+# Canvas mode: "RGB", or "P" to render into a palette image (hard edged text
+# and icons, smaller frames to diff and encode)
+RENDER_MODE = "RGB"
+
+# In low light the panel sleeps; a button press wakes it for this many seconds
+DARK_WAKE_TIME = 30.0
+
+# Scheduler task periods in seconds
+SAMPLE_INTERVAL = 1.0
+CONTROL_INTERVAL = 1.0
+RENDER_INTERVAL = 1.0 / FPS  # while in use or animating
+IDLE_RENDER_INTERVAL = 3.0  # nobody is looking, just keep the bars and readouts fresh
+ACTIVE_RENDER_TIME = 30.0  # full rate this long after a button press
+SAVE_INTERVAL = 5.0
+RELOAD_INTERVAL = 2.0
+LOG_INTERVAL = 600
+METRICS_INTERVAL = 300
+
+# Channel log lines are written on events, when a value moves more than its
+# deadband since the last written line, or at least once per heartbeat
+LOG_HEARTBEAT_INTERVAL = 600
+LOG_MOISTURE_DEADBAND = 0.5  # Hz
+LOG_SATURATION_DEADBAND = 2.0  # percentage points
+LOG_LIGHT_DEADBAND = 25.0  # lux
+
+# Background log writer
+LOG_QUEUE_SIZE = 1000  # records; memory bound for the writer queue
+LOG_BATCH_SIZE = 50  # records written per batch
+LOG_FLUSH_INTERVAL = 5.0  # seconds a record may wait before its batch is written
+LOG_QUEUE_POLICY = "drop"  # "drop" the new record or "block" briefly when the queue is full
+
+# Channel log rotation; rotated segments are gzipped in the background
+LOG_MAX_BYTES = 1024 * 1024  # rotate when the active file reaches this size, 0 disables
+LOG_ROTATE_DAILY = True  # also rotate on the first record of a new day
+LOG_RETENTION_DAYS = 30  # remove segments older than this, 0 keeps them
+LOG_RETENTION_SEGMENTS = 90  # keep at most this many segments per channel, 0 for no limit
+
 BUTTONS = [5, 6, 16, 24]
 LABELS = ["A", "B", "X", "Y"]
 
@@ -35,12 +35,65 @@
 # ├── hardware.py
 # └── plant_logging.py
 #
-# context.py : v2-1.0 (stable) - refactor C1.0.0
+# context.py : v2-1.0.f2 (stable) - refactor C1.0.0
+# changelog : f1 - track light_level_low so the scheduler tasks share one decision
+#           : f2 - added SensorFrame, all sensors are read once per sampling tick and shared from there
 # 
+import time
+from array import array
+
+# Channel id -> position in the frame arrays, shared by every frame with the same channels
+_frame_index = {}
+
+# One consistent snapshot of every sensor, taken once per sampling tick and
+# handed to control, views and logging so they all see the same values
+class SensorFrame:
+    __slots__ = ("timestamp", "light", "channels", "moisture", "saturation", "active", "_index")
+
+    def __init__(self, timestamp, light, channels, moisture, saturation, active):
+        self.timestamp = timestamp
+        self.light = light
+        self.channels = channels
+        self.moisture = moisture
+        self.saturation = saturation
+        self.active = active
+        self._index = _frame_index.get(channels)
+        if self._index is None:
+            self._index = _frame_index[channels] = {channel_id: i for i, channel_id in enumerate(channels)}
+
+    @classmethod
+    def sample(cls, light_sensor, channels):
+        moisture = array("d")
+        saturation = array("d")
+        active = bytearray()
+        for channel in channels:
+            sensor = channel.sensor
+            moisture.append(sensor.moisture)
+            saturation.append(sensor.saturation)
+            active.append(bool(sensor.active))
+        return cls(
+            time.monotonic(),
+            light_sensor.get_lux(),
+            tuple(channel.channel for channel in channels),
+            moisture,
+            saturation,
+            active,
+        )
+
+    def moisture_of(self, channel_id):
+        return self.moisture[self._index[channel_id]]
+
+    def saturation_of(self, channel_id):
+        return self.saturation[self._index[channel_id]]
+
+    def active_of(self, channel_id):
+        return bool(self.active[self._index[channel_id]])
+
 class Context:
     def __init__(self):
+        self.frame = None
         self.light_level = None
-        self.soil_moisture = {}
+        self.light_level_low = False
         self.temperature = None
         self.humidity = None
         # Add other relevant fields as needed
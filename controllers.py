@@ -34,7 +34,10 @@
 # ├── hardware.py
 # └── plant_logging.py
 #
-# controllers.py : v2-2.5 (stable) - refactor C1.0.0
+# controllers.py : v2-2.5.f3 (stable) - refactor C1.0.0
+# changelog : f1 - animating() of the current view, for the render rate governor
+#           : f2 - a view entry can be a function that builds it on the first visit
+#           : f3 - insert() adds a view entry without moving away from the current one
 class ViewController:
     def __init__(self, views):
         self.views = views
@@ -46,6 +49,7 @@ class ViewController:
         return self._current_view == 0 and self._current_subview == 0
 
     def next_subview(self):
+        self.get_current_view()  # Builds the entry if it hasn't been yet
         view = self.views[self._current_view]
         if isinstance(view, tuple):
             self._current_subview += 1
@@ -63,8 +67,17 @@ class ViewController:
             self._current_view %= len(self.views)
             self._current_subview = 0
 
+    def insert(self, index, view):
+        # Add a view entry at runtime; the one on screen stays on screen
+        self.views.insert(index, view)
+        if index <= self._current_view:
+            self._current_view += 1
+
     def get_current_view(self):
         view = self.views[self._current_view]
+        if callable(view):
+            # Built on the first visit
+            view = self.views[self._current_view] = view()
         if isinstance(view, tuple):
             view = view[self._current_subview]
         return view
@@ -79,6 +92,9 @@ class ViewController:
     def render(self):
         self.view.render()
 
+    def animating(self):
+        return self.view.animating()
+
     def button_a(self):
         if not self.view.button_a():
             self.next_view()
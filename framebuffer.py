@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+#    ___     _                                         
+#   / _ \___| |_ ___ _ __                              
+#  / /_)/ _ \ __/ _ \ '__|                             
+# / ___/  __/ ||  __/ |                                
+# \/    \___|\__\___|_|                                                                                 
+#    ___ _             _   __    __      _       _     
+#   / _ \ | __ _ _ __ | |_/ / /\ \ \__ _| |_ ___| |__  
+#  / /_)/ |/ _` | '_ \| __\ \/  \/ / _` | __/ __| '_ \ 
+# / ___/| | (_| | | | | |_ \  /\  / (_| | || (__| | | |
+# \/    |_|\__,_|_| |_|\__| \/  \/ \__,_|\__\___|_| |_|
+#                       .: auto-grow the greens yo :.                          
+#
+# Automated plant monitoring and watering system
+#
+# hardware platform  : Raspberry Pi Zero W
+# HAT                : Pimoroni Grow Hat Mini
+# Water drivers      : COM3700 Mini submersible water pump
+# Sensors            : Capacitive Soil moisture sensor with PFM output
+#                    : BME280 Temperature, Humidity, Air pressure
+#                    : LTR-559 light and proximity sensor 
+# Codebase           : Python3
+#
+# (2024) JinjiroSan
+#
+# PeterPlantwatch/
+# ├── main.py
+# ├── config.py
+# ├── views.py
+# ├── controllers.py
+# ├── models.py
+# ├── icons.py
+# ├── constants.py
+# ├── hardware.py
+# ├── plant_logging.py
+# ├── metrics.py
+# ├── scheduler.py
+# ├── buttons.py
+# ├── benchmark.py
+# ├── sampling.py
+# └── framebuffer.py
+#
+# framebuffer.py : v1-1.0.f5 (stable)
+# changelog : f1 - dirty rectangle tracking, changed regions are sent as windowed (CASET/RASET) writes
+#           : f2 - DisplayWriter sends frames from its own thread, latest frame wins
+#           : f3 - RGB565 is packed straight into bytes, encoded constant frames are cached, "P" frames encode through a palette table
+#           : f4 - dark mode: the writer puts the panel to sleep and drops frames until it is woken
+#           : f5 - input.latency_ms is recorded once the frame answering a press has been sent
+
+import logging
+import threading
+import time
+
+import numpy
+
+import metrics
+
+# Bytes a window costs on top of its pixels: CASET + RASET + RAMWR with their
+# parameters, plus the D/C toggling and transfer setup around them
+WINDOW_OVERHEAD = 64
+MAX_RECTS = 8
+
+
+def _runs(flags, gap):
+    # (start, end) inclusive runs of True in a 1D bool array, joining runs that
+    # are separated by `gap` or fewer False entries
+    indices = numpy.flatnonzero(flags)
+    if indices.size == 0:
+        return []
+    breaks = numpy.flatnonzero(numpy.diff(indices) > gap + 1)
+    starts = numpy.concatenate(([indices[0]], indices[breaks + 1]))
+    ends = numpy.concatenate((indices[breaks], [indices[-1]]))
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def dirty_rects(mask, max_rects=MAX_RECTS, overhead=WINDOW_OVERHEAD):
+    # Merge the changed pixels in `mask` (height x width bools) into a few
+    # bounding rectangles (x0, y0, x1, y1), inclusive. Returns None when more
+    # than max_rects would be needed.
+    rects = []
+    width = mask.shape[1]
+    # Rows: a gap is only worth a new window when resending it costs more than the window
+    for y0, y1 in _runs(mask.any(axis=1), overhead // (width * 2)):
+        band = mask[y0:y1 + 1]
+        for x0, x1 in _runs(band.any(axis=0), overhead // ((y1 - y0 + 1) * 2)):
+            rects.append((x0, y0, x1, y1))
+            if len(rects) > max_rects:
+                return None
+    return rects
+
+
+def rect_cost(rect):
+    x0, y0, x1, y1 = rect
+    return (x1 - x0 + 1) * (y1 - y0 + 1) * 2 + WINDOW_OVERHEAD
+
+
+def rgb565(pixels):
+    # Big endian RGB565 bytes for an (h, w, 3) uint8 array. Both bytes are
+    # packed in uint8, so there are no 16 bit temporaries or byte swapping.
+    red, green, blue = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    packed = numpy.empty(pixels.shape[:2] + (2,), dtype=numpy.uint8)
+    numpy.bitwise_or(red & 0xF8, green >> 5, out=packed[..., 0])
+    numpy.bitwise_or((green & 0x1C) << 3, blue >> 3, out=packed[..., 1])
+    return packed.tobytes()
+
+
+def palette565(palette):
+    # 256 entry big endian RGB565 table for a flat [r, g, b, ...] palette
+    colors = numpy.zeros((256, 3), dtype=numpy.uint8)
+    entries = numpy.asarray(palette[:768], dtype=numpy.uint8).reshape(-1, 3)
+    colors[:len(entries)] = entries
+    return numpy.frombuffer(rgb565(colors[None]), dtype=">u2")
+
+
+def encode(pixels, table=None):
+    # RGB565 bytes for an RGB (h, w, 3) array, or for an (h, w) array of
+    # palette indices with the table from palette565()
+    if table is None:
+        return rgb565(pixels)
+    return table[pixels].tobytes()
+
+
+# Sits between the views and the ST7735 driver. A frame that is identical to
+# the last one pushed is not sent at all. When only parts of the frame
+# changed, just those regions are sent as windowed writes; if the windows
+# would cost more than the whole panel the full frame is pushed instead.
+class DisplayOutput:
+    def __init__(self, display):
+        self.display = display
+        self.frames = 0
+        self.pushed = 0
+        self.partial = 0
+        self.skipped = 0
+        self.bytes_sent = 0
+        self._last = None
+        self._last_table = None
+        self._table = None
+        self._table_palette = None
+        self._constants = {}
+        self._rotation = getattr(display, "_rotation", 0) // 90
+
+    def constant(self, image):
+        # Register an image that never changes (e.g. the blank frame): its
+        # pixels and encoded bytes are worked out once and reused on every push
+        frame, table = self._frame(image)
+        data = encode(numpy.rot90(frame, self._rotation), table)
+        self._constants[id(image)] = (image, frame, table, data)
+        return image
+
+    def is_constant(self, image):
+        return id(image) in self._constants
+
+    def _frame(self, image):
+        if image.mode == "P":
+            palette = image.getpalette()
+            if palette != self._table_palette:
+                self._table = palette565(palette)
+                self._table_palette = palette
+            return numpy.asarray(image), self._table
+        return numpy.asarray(image.convert("RGB") if image.mode != "RGB" else image), None
+
+    def push(self, image):
+        self.frames += 1
+        constant = self._constants.get(id(image))
+        if constant is not None:
+            frame, table, data = constant[1:]
+        else:
+            frame, table = self._frame(image)
+            data = None
+
+        if self._last is None or self._last.shape != frame.shape:
+            self._push_full(frame, table, data)
+        else:
+            mask = frame != self._last
+            if mask.ndim == 3:
+                mask = mask.any(axis=2)
+            elif table is not self._last_table:
+                # Palette entries that changed colour repaint pixels whose index didn't change
+                mask |= (table != self._last_table)[frame]
+            if not mask.any():
+                self.skipped += 1
+                metrics.incr("display.skipped")
+                metrics.observe("display.bytes", 0)
+                return False
+
+            rects = dirty_rects(mask)
+            full_cost = frame.shape[0] * frame.shape[1] * 2
+            if rects is None or sum(rect_cost(rect) for rect in rects) >= full_cost:
+                self._push_full(frame, table, data)
+            else:
+                self._push_rects(frame, table, rects)
+
+        self._last = frame
+        self._last_table = table
+        return True
+
+    def _push_full(self, frame, table=None, data=None):
+        if data is None:
+            data = encode(numpy.rot90(frame, self._rotation), table)
+        self.display.set_window()
+        self.display.data(data)
+        sent = len(data)
+        self.pushed += 1
+        self.bytes_sent += sent
+        metrics.incr("display.pushed")
+        metrics.observe("display.bytes", sent)
+
+    def _push_rects(self, frame, table, rects):
+        sent = 0
+        for rect in rects:
+            x0, y0, x1, y1 = rect
+            pixels = numpy.rot90(frame[y0:y1 + 1, x0:x1 + 1], self._rotation)
+            self.display.set_window(*self._panel_window(rect, frame.shape))
+            data = encode(pixels, table)
+            self.display.data(data)
+            sent += len(data) + WINDOW_OVERHEAD
+        self.partial += 1
+        self.bytes_sent += sent
+        metrics.incr("display.partial")
+        metrics.observe("display.bytes", sent)
+        metrics.observe("display.rects", len(rects))
+
+    def _panel_window(self, rect, shape):
+        # Map an image rectangle to the panel's native (unrotated) column/row window
+        x0, y0, x1, y1 = rect
+        height, width = shape[:2]
+        if self._rotation == 1:
+            return y0, width - 1 - x1, y1, width - 1 - x0
+        if self._rotation == 2:
+            return width - 1 - x1, height - 1 - y1, width - 1 - x0, height - 1 - y0
+        if self._rotation == 3:
+            return height - 1 - y1, x0, height - 1 - y0, x1
+        return x0, y0, x1, y1
+
+    def invalidate(self):
+        # Force the next frame out in full, e.g. when the panel contents may have been lost
+        self._last = None
+
+
+# Sends frames to the panel on its own thread so the control loop never waits
+# for RGB565 conversion or SPI. There are two frame buffers: submit() copies
+# the rendered canvas into whichever one isn't being sent and makes it the
+# pending frame. If the writer is still busy when the next frame arrives the
+# pending one is overwritten (and counted as dropped), frames never queue up.
+# Constant frames registered with the output are passed on without a copy.
+class DisplayWriter(threading.Thread):
+    def __init__(self, output):
+        super().__init__(name="plantwatch-display-writer", daemon=True)
+        self.output = output
+        self.submitted = 0
+        self.sent = 0
+        self.dropped = 0
+        self.dark = False
+        self._dark_since = None
+        self._dark_seconds = 0.0
+        self._buffers = []
+        self._pending = None
+        self._pending_inputs = []  # Press timestamps the pending frame is the answer to
+        self._sending = None
+        self._running = True
+        self._condition = threading.Condition()
+        self._bus = threading.Lock()
+
+    def submit(self, image, inputs=()):
+        # inputs: time.monotonic() of the presses this frame shows; a dropped
+        # frame hands them on to the one that replaces it
+        if self.dark:
+            return
+        with self._condition:
+            self._pending_inputs.extend(inputs)
+            self.submitted += 1
+            if self._pending is not None:
+                self.dropped += 1
+                metrics.incr("display.dropped")
+
+            if self.output.is_constant(image):
+                # Never changes, so it can be sent as it is
+                buffer = image
+            else:
+                if self._pending is not None and not self.output.is_constant(self._pending):
+                    buffer = self._pending
+                else:
+                    buffer = self._free_buffer(image)
+                buffer.paste(image)
+                if image.mode == "P":
+                    buffer.putpalette(image.getpalette())
+            self._pending = buffer
+            self._condition.notify()
+
+    def _free_buffer(self, image):
+        for buffer in self._buffers:
+            if buffer is not self._sending and buffer.size == image.size and buffer.mode == image.mode:
+                return buffer
+        buffer = image.copy()
+        self._buffers = [b for b in self._buffers if b is self._sending] + [buffer]
+        return buffer
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and self._running:
+                    self._condition.wait()
+                if self._pending is None:
+                    return
+                self._sending, self._pending = self._pending, None
+                inputs, self._pending_inputs = self._pending_inputs, []
+
+            started = time.monotonic()
+            try:
+                with self._bus:
+                    self.output.push(self._sending)
+            except Exception:
+                logging.exception("Display write failed")
+                self.output.invalidate()
+            now = time.monotonic()
+            metrics.observe("display.transfer_ms", (now - started) * 1000)
+            for timestamp in inputs:
+                # From the press to the frame that shows it being on the panel
+                metrics.observe("input.latency_ms", (now - timestamp) * 1000)
+            self.sent += 1
+            if self.sent == 1:
+                metrics.gauge("startup.first_frame_s", round(metrics.process_uptime(), 3))
+                logging.info(f"First frame {metrics.get_gauge('startup.first_frame_s'):.3f}s after process start")
+
+            with self._condition:
+                self._sending = None
+                self._condition.notify_all()
+
+    def call(self, func, *args):
+        # Run a display command (sleep, wake, ...) without interleaving it with a frame
+        with self._bus:
+            return func(*args)
+
+    def set_dark(self, dark, blank=None):
+        # Sleep/wake commands only go out when the state changes. The panel
+        # is blanked before it sleeps so it wakes up to a known picture.
+        if dark == self.dark:
+            return False
+        if dark:
+            if blank is not None:
+                self.submit(blank)
+                self.flush()
+            self.dark = True
+            self.call(self.output.display.sleep)
+            self._dark_since = time.monotonic()
+        else:
+            self.call(self.output.display.wake)
+            self.dark = False
+            self._dark_seconds += time.monotonic() - self._dark_since
+            self._dark_since = None
+        metrics.incr("display.sleeps" if dark else "display.wakes")
+        return True
+
+    @property
+    def dark_seconds(self):
+        if self._dark_since is None:
+            return self._dark_seconds
+        return self._dark_seconds + time.monotonic() - self._dark_since
+
+    def flush(self, timeout=1.0):
+        # Wait until the pending frame, if any, has been sent
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while (self._pending is not None or self._sending is not None) and self.is_alive():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def stop(self, timeout=1.0):
+        # Send the last pending frame and let the thread finish
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self.is_alive():
+            self.join(timeout)
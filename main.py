@@ -34,37 +34,53 @@
 # ├── hardware.py
 # └── plant_logging.py
 #
-# main.py : v2-2.5.1 (stable) - refactor C1.0.0
+# main.py : v2-2.5.1.f18 (stable) - refactor C1.0.0
 # changelog : f1 - added seprate reusable context.py
-
+#           : f2 - replaced the fixed FPS loop with a multi-rate scheduler (sample, control, render, save, log)
+#           : f3 - button presses are queued from the GPIO thread and handled by the main loop, which wakes and re-renders immediately
+#           : f4 - settings are flushed in the background when they change, and once more on exit
+#           : f5 - loop reads the typed settings snapshot; settings.yml is reloaded when it changes on disk
+#           : f6 - sensors are sampled once per tick into a SensorFrame shared by control, views and logging
+#           : f7 - frames go through DisplayOutput, which skips pushing frames identical to the last one
+#           : f8 - logs the time from process start to the first frame on the panel
+#           : f9 - frames are handed to a DisplayWriter thread instead of being sent from the loop, it also logs the first frame time
+#           : f10 - canvas mode comes from RENDER_MODE, the blank frame is a constant frame encoded once
+#           : f11 - dark mode: in low light nothing is rendered or sent, a button press wakes the panel
+#           : f12 - render rate follows UI activity: full rate after input or while animating, idle rate otherwise
+#           : f13 - --headless runs only sampling, control, logging and settings; display, views, fonts and icons are never imported
+#           : f14 - channels come from the channelN sections of settings.yml, their views are built on first use
+#           : f15 - input.latency_ms is measured up to the frame being sent by the writer
+#           : f16 - render.cpu_ms counts the CPU time of the main thread only
+#           : f17 - channels and the alarm are updated from the validated settings snapshot, not the raw yaml
+#           : f18 - SIGTERM exits through the atexit handlers, so logs and settings are flushed
+
+import atexit
 import logging
 import math
 import pathlib
 import random
+import signal
 import sys
 import threading
 import time
-from PIL import Image, ImageDraw
 
 import ltr559
 import RPi.GPIO as GPIO
-import ST7735
-from fonts.ttf import RobotoMedium as UserFont
 import yaml
 from grow import Piezo                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                     
 from grow.moisture import Moisture
 from grow.pump import Pump
-from models import Channel, Alarm
-from views import MainView, SettingsView, DetailView, ChannelEditView
-from controllers import ViewController
+from models import ChannelRegistry, Alarm
 from config import Config
-from constants import DISPLAY_WIDTH, DISPLAY_HEIGHT, BUTTONS, LABELS, FPS, COLOR_WHITE
+from constants import DISPLAY_WIDTH, DISPLAY_HEIGHT, BUTTONS, LABELS, FPS, COLOR_WHITE, RENDER_MODE, DARK_WAKE_TIME
+from constants import SAMPLE_INTERVAL, CONTROL_INTERVAL, RENDER_INTERVAL, IDLE_RENDER_INTERVAL, ACTIVE_RENDER_TIME, SAVE_INTERVAL, RELOAD_INTERVAL, LOG_INTERVAL, METRICS_INTERVAL
 from plant_logging import log_values
-from context import Context
+from context import Context, SensorFrame
+from scheduler import Scheduler, RateGovernor
+from buttons import ButtonQueue
+import metrics
 
-def handle_button(pin):
-    index = BUTTONS.index(pin)
-    label = LABELS[index]
+def handle_button(label):
 
     if label == "A":
         viewcontroller.button_a()
@@ -80,52 +96,38 @@ def handle_button(pin):
     elif label == "Y":
         viewcontroller.button_y()
 
-def main():
+def main(headless=False):
     global viewcontroller, alarm
 
     # Basic logging configuration
     logging.basicConfig(level=logging.DEBUG)
 
-    # Set up the ST7735 SPI Display
-    display = ST7735.ST7735(
-        port=0, cs=1, dc=9, backlight=12, rotation=270, spi_speed_hz=80000000
-    )
-    display.begin()
+    # systemctl stop and kill send SIGTERM, which would skip the atexit flushes
+    # (queued channel log lines, a pending settings save). Exit through them instead.
+    def terminate(signum, frame):
+        raise SystemExit(128 + signum)
+
+    signal.signal(signal.SIGTERM, terminate)
 
     # Set up light sensor
     light = ltr559.LTR559()
 
-    # Set up our canvas and prepare for drawing
-    image = Image.new("RGB", (DISPLAY_WIDTH, DISPLAY_HEIGHT), color=(255, 255, 255))  # Use RGB mode for display compatibility
-    draw = ImageDraw.Draw(image)  # Create a drawing context for the canvas
-
-    # Setup blank image for darkness
-    image_blank = Image.new("RGB", (DISPLAY_WIDTH, DISPLAY_HEIGHT), color=(0, 0, 0))
-
-    # Pick a random selection of plant icons to display on screen
-    channels = [
-        Channel(1, 1, 1),
-        Channel(2, 2, 2),
-        Channel(3, 3, 3),
-    ]
-
-    alarm = Alarm(image)
+    alarm = Alarm()
 
     config = Config()
 
-    GPIO.setmode(GPIO.BCM)
-    GPIO.setwarnings(False)
-    GPIO.setup(BUTTONS, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-
-    for pin in BUTTONS:
-        GPIO.add_event_detect(pin, GPIO.FALLING, handle_button, bouncetime=200)
-
     config.load()
+    atexit.register(config.flush)  # Don't lose a pending write-behind save on exit
+
+    # One channel per channelN section of settings.yml
+    registry = ChannelRegistry()
+    registry.sync(config.settings)
+    channels = registry.channels
 
     for channel in channels:
-        channel.update_from_yml(config.get_channel(channel.channel))
+        channel.update_from_yml(config.settings.channel(channel.channel))
 
-    alarm.update_from_yml(config.get_general())
+    alarm.update_from_yml(config.settings.general)
 
     print("Channels:")
     for channel in channels:
@@ -140,95 +142,130 @@ Low Light Value {:.2f}
 """.format(
             alarm.enabled,
             alarm.interval,
-            config.get_general().get("black_screen_when_light_low"),
-            config.get_general().get("light_level_low")
+            config.settings.general.black_screen_when_light_low,
+            config.settings.general.light_level_low
         )
     )
 
-    main_options = [
-        {
-            "title": "Alarm Interval",
-            "prop": "interval",
-            "inc": 1,
-            "min": 1,
-            "max": 60,
-            "format": lambda value: f"{value:02.0f}sec",
-            "object": alarm,
-            "help": "Time between alarm beeps.",
-        },
-        {
-            "title": "Alarm Enable",
-            "prop": "enabled",
-            "mode": "bool",
-            "format": lambda value: "Yes" if value else "No",
-            "object": alarm,
-            "help": "Enable the piezo alarm beep.",
-        },
-    ]
-
-    viewcontroller = ViewController(
-        [
-            (
-                MainView(image, channels=channels, alarm=alarm),
-                SettingsView(image, options=main_options),
-            ),
-            (
-                DetailView(image, channel=channels[0]),
-                ChannelEditView(image, channel=channels[0]),
-            ),
-            (
-                DetailView(image, channel=channels[1]),
-                ChannelEditView(image, channel=channels[1]),
-            ),
-            (
-                DetailView(image, channel=channels[2]),
-                ChannelEditView(image, channel=channels[2]),
-            ),
-        ]
-    )
+    if not headless:
+        # Display, PIL, fonts and icons are only loaded when there is a panel to draw on
+        import ST7735
+        from PIL import Image
+        from views import MainView, SettingsView, DetailView, ChannelEditView
+        from controllers import ViewController
+        from framebuffer import DisplayOutput, DisplayWriter
+
+        # Set up the ST7735 SPI Display
+        display = ST7735.ST7735(
+            port=0, cs=1, dc=9, backlight=12, rotation=270, spi_speed_hz=80000000
+        )
+        display.begin()
+        output = DisplayOutput(display)
+        writer = DisplayWriter(output)  # SPI transfers happen on this thread, off the control loop
+        writer.start()
+        atexit.register(writer.stop)
 
-    # Create context object
-    context = Context()
+        # Set up our canvas and prepare for drawing
+        image = Image.new(RENDER_MODE, (DISPLAY_WIDTH, DISPLAY_HEIGHT), color=(255, 255, 255))
 
-    # Log values initially
-    context.light_level = light.get_lux()
-    for channel in channels:
-        context.soil_moisture[channel.channel] = channel.sensor.moisture
-        log_values(
-            channel.channel,
-            channel.sensor.moisture,
-            channel.sensor.saturation * 100,
-            channel.water(),
-            context.light_level
+        # Setup blank image for darkness
+        image_blank = output.constant(Image.new(RENDER_MODE, (DISPLAY_WIDTH, DISPLAY_HEIGHT), color=(0, 0, 0)))
+
+        # Presses are only queued on the GPIO callback thread; the main loop handles them
+        buttons = ButtonQueue()
+
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setwarnings(False)
+        GPIO.setup(BUTTONS, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+
+        for pin in BUTTONS:
+            GPIO.add_event_detect(pin, GPIO.FALLING, buttons.put, bouncetime=200)
+
+        main_options = [
+            {
+                "title": "Alarm Interval",
+                "prop": "interval",
+                "inc": 1,
+                "min": 1,
+                "max": 60,
+                "format": lambda value: f"{value:02.0f}sec",
+                "object": alarm,
+                "help": "Time between alarm beeps.",
+            },
+            {
+                "title": "Alarm Enable",
+                "prop": "enabled",
+                "mode": "bool",
+                "format": lambda value: "Yes" if value else "No",
+                "object": alarm,
+                "help": "Enable the piezo alarm beep.",
+            },
+        ]
+
+        def channel_views(channel):
+            # A channel's detail and edit views are built when it is first shown
+            return lambda: (
+                DetailView(image, channel=channel, channels=channels),
+                ChannelEditView(image, channel=channel),
+            )
+
+        viewcontroller = ViewController(
+            [
+                (
+                    MainView(image, channels=channels, alarm=alarm),
+                    SettingsView(image, options=main_options),
+                ),
+            ]
+            + [channel_views(channel) for channel in channels]
         )
 
-    last_log_time = time.time()  # Track the last log time
+    # Create context object
+    context = Context()
 
-    while True:
-        # Update context with latest sensor values
-        context.light_level = light.get_lux()
-        for channel in channels:
-            context.soil_moisture[channel.channel] = channel.sensor.moisture
+    def sample():
+        # Read every sensor exactly once; control, views and logging all use this frame
+        context.frame = SensorFrame.sample(light, channels)
+        context.light_level = context.frame.light
+        context.light_level_low = context.light_level < config.settings.general.light_level_low
 
+    def control():
         for channel in channels:
-            config.set_channel(channel.channel, channel)
             channel.update(context)  # Pass the context to the update method
             if channel.alarm:
                 alarm.trigger()
 
-        light_level_low = context.light_level < config.get_general().get("light_level_low")
+        alarm.update(context.light_level_low)
 
-        alarm.update(light_level_low)
+    # Until when a button press keeps the panel on in low light
+    wake_until = [0.0]
+    # Presses the next frame answers, the writer records their latency once it is sent
+    pressed = []
 
+    def render():
+        dark = (
+            context.light_level_low
+            and config.settings.general.black_screen_when_light_low
+            and time.monotonic() >= wake_until[0]
+        )
+        writer.set_dark(dark, image_blank)
+        if dark:
+            # Nothing is rendered or sent while the panel sleeps
+            metrics.incr("render.dark_skipped")
+            scheduler.set_period("render", IDLE_RENDER_INTERVAL)
+            return
+
+        governor.frame_started()
         viewcontroller.update()
-
-        if light_level_low and config.get_general().get("black_screen_when_light_low"):
-            display.sleep()
-            display.display(image_blank.convert("RGB"))
-        else:
-            viewcontroller.render()
-            display.wake()
-            display.display(image)
+        viewcontroller.render()
+        writer.submit(image, pressed)
+        pressed.clear()
+        cpu_time = governor.frame()  # Main thread CPU time only, not the writer, log or timer threads
+        metrics.observe("render.cpu_ms", cpu_time * 1000)
+        scheduler.set_period("render", governor.period(viewcontroller.animating()))
+
+    def save():
+        for channel in channels:
+            config.set_channel(channel.channel, channel)
 
         config.set_general(
             {
@@ -237,22 +274,95 @@ Low Light Value {:.2f}
             }
         )
 
-        current_time = time.time()
-        if current_time - last_log_time >= 600:  # Log every 600 seconds (10 minutes)
-            logging.debug("Logging values for all channels")
-            for channel in channels:
-                log_values(
-                    channel.channel,
-                    channel.sensor.moisture,
-                    channel.sensor.saturation * 100,
-                    channel.water(),
-                    context.light_level
-                )
-            last_log_time = current_time
-
         config.save()
 
-        time.sleep(1.0 / FPS)
+    def reload():
+        try:
+            if not config.reload_if_changed():
+                return
+        except (yaml.YAMLError, ValueError) as e:
+            logging.error(f"Keeping current settings: {e}")
+            return
+
+        added = registry.sync(config.settings)
+        for channel in channels:
+            channel.update_from_yml(config.settings.channel(channel.channel))
+        alarm.update_from_yml(config.settings.general)
+
+        if added:
+            if not headless:
+                for channel in added:
+                    viewcontroller.insert(channels.index(channel) + 1, channel_views(channel))
+            sample()  # Control and logging expect a reading for every channel
+
+    def log():
+        logging.debug("Logging values for all channels")
+        frame = context.frame
+        for channel in channels:
+            log_values(
+                channel.channel,
+                frame.moisture_of(channel.channel),
+                frame.saturation_of(channel.channel) * 100,
+                channel.water(),
+                frame.light
+            )
+
+    def report():
+        if headless:
+            scheduler.report()
+            metrics.report()
+            return
+
+        # What dark mode saved: time asleep and the render CPU time of the frames it skipped
+        metrics.gauge("display.dark_seconds", round(writer.dark_seconds, 1))
+        render_cpu = metrics.stat("render.cpu_ms")
+        if render_cpu is not None:
+            saved = metrics.counter("render.dark_skipped") * render_cpu.mean / 1000
+            metrics.gauge("render.dark_cpu_saved_s", round(saved, 1))
+        scheduler.report()
+        metrics.report()
+
+    # Log values initially
+    sample()
+    log()
+
+    # Each job runs at its own rate; sampling always runs before control in the same pass
+    scheduler = Scheduler()
+    scheduler.add("sample", sample, SAMPLE_INTERVAL)
+    scheduler.add("control", control, CONTROL_INTERVAL)
+    if not headless:
+        # Full frame rate after input or while a view animates, a slow idle rate otherwise
+        governor = RateGovernor(RENDER_INTERVAL, IDLE_RENDER_INTERVAL, ACTIVE_RENDER_TIME)
+        metrics.collector(governor.publish)
+        scheduler.add("render", render, RENDER_INTERVAL)
+    scheduler.add("save", save, SAVE_INTERVAL, offset=SAVE_INTERVAL)
+    scheduler.add("reload", reload, RELOAD_INTERVAL, offset=RELOAD_INTERVAL)
+    scheduler.add("log", log, LOG_INTERVAL, offset=LOG_INTERVAL)  # Log every 600 seconds (10 minutes)
+    scheduler.add("metrics", report, METRICS_INTERVAL, offset=METRICS_INTERVAL)
+
+    def wait_for_input(timeout):
+        # Sleep until the next task is due, but wake up as soon as a button is pressed
+        events = buttons.wait(timeout)
+        if not events:
+            return
+
+        # In low light any press keeps the panel on for a while. The press
+        # that wakes it isn't passed on to a view nobody could see.
+        if context.light_level_low:
+            wake_until[0] = time.monotonic() + DARK_WAKE_TIME
+        if not writer.dark:
+            for event in events:
+                handle_button(event.label)
+
+        governor.activity()
+        pressed.extend(event.timestamp for event in events)
+        scheduler.run_now("render")
+
+    if headless:
+        # No buttons to wake up for, just sleep until the next task is due
+        scheduler.run(wait=time.sleep)
+    else:
+        scheduler.run(wait=wait_for_input)
 
 if __name__ == "__main__":
-    main()
+    main(headless="--headless" in sys.argv[1:])
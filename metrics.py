@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+#    ___     _                                         
+#   / _ \___| |_ ___ _ __                              
+#  / /_)/ _ \ __/ _ \ '__|                             
+# / ___/  __/ ||  __/ |                                
+# \/    \___|\__\___|_|                                                                                 
+#    ___ _             _   __    __      _       _     
+#   / _ \ | __ _ _ __ | |_/ / /\ \ \__ _| |_ ___| |__  
+#  / /_)/ |/ _` | '_ \| __\ \/  \/ / _` | __/ __| '_ \ 
+# / ___/| | (_| | | | | |_ \  /\  / (_| | || (__| | | |
+# \/    |_|\__,_|_| |_|\__| \/  \/ \__,_|\__\___|_| |_|
+#                       .: auto-grow the greens yo :.                          
+#
+# Automated plant monitoring and watering system
+#
+# hardware platform  : Raspberry Pi Zero W
+# HAT                : Pimoroni Grow Hat Mini
+# Water drivers      : COM3700 Mini submersible water pump
+# Sensors            : Capacitive Soil moisture sensor with PFM output
+#                    : BME280 Temperature, Humidity, Air pressure
+#                    : LTR-559 light and proximity sensor 
+# Codebase           : Python3
+#
+# (2024) JinjiroSan
+#
+# PeterPlantwatch/
+# ├── main.py
+# ├── config.py
+# ├── views.py
+# ├── controllers.py
+# ├── models.py
+# ├── icons.py
+# ├── constants.py
+# ├── hardware.py
+# ├── plant_logging.py
+# └── metrics.py
+#
+# metrics.py : v1-1.0.f2 (stable)
+# changelog : f1 - collectors, so caches can publish their counters just before a report
+#           : f2 - process_uptime(), seconds since the process was started
+
+import logging
+import os
+import threading
+import time
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_stats = {}
+_collectors = []
+_imported = time.monotonic()
+
+
+# Running count/total/min/max/last for a measured value
+class Stat:
+    __slots__ = ("count", "total", "min", "max", "last")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.last = value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def __str__(self):
+        if not self.count:
+            return "n=0"
+        return "n={} mean={:.4f} min={:.4f} max={:.4f} last={:.4f}".format(
+            self.count, self.mean, self.min, self.max, self.last
+        )
+
+
+def incr(name, amount=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def gauge(name, value):
+    _gauges[name] = value
+
+
+def observe(name, value):
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            stat = _stats[name] = Stat()
+        stat.add(value)
+
+
+def counter(name):
+    return _counters.get(name, 0)
+
+
+def get_gauge(name, default=None):
+    return _gauges.get(name, default)
+
+
+def stat(name):
+    return _stats.get(name)
+
+
+def snapshot():
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "stats": dict(_stats),
+        }
+
+
+def collector(func):
+    # Register a function that publishes gauges when a report is made
+    _collectors.append(func)
+    return func
+
+
+def report(logger=None):
+    logger = logger or logging.getLogger("metrics")
+    for func in _collectors:
+        func()
+    data = snapshot()
+    for name, value in sorted(data["counters"].items()):
+        logger.info(f"{name}: {value}")
+    for name, value in sorted(data["gauges"].items()):
+        logger.info(f"{name}: {value}")
+    for name, value in sorted(data["stats"].items()):
+        logger.info(f"{name}: {value}")
+
+
+def process_uptime():
+    # Seconds since the process started, interpreter start-up and imports
+    # included. Falls back to time since this module was imported off Linux.
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - _imported
@@ -34,7 +34,7 @@
 # ├── hardware.py
 # └── plant_logging.py
 #
-# models.py : v2-2.7.2.f13 (stable) - refactor C1.0.0
+# models.py : v2-2.7.2.f23 (stable) - refactor C1.0.0
 # changelog : f1 - condition for ignoring invalid readings checks if the saturation is higher than the defined water_level instead of assuming it is always 100%
 #           : f2 - ensure the update method in Channel properly reflects when watering occurs
 #           : f3 - correctly import log_values
@@ -48,20 +48,61 @@
 #           :f11 - refactored the simulation update function
 #           :f12 - updated should_water function
 #           :f13 - store more values for deque calculations (10 instead of 5 readings)
+#           :f14 - update takes its readings from the per-tick SensorFrame and keeps them for the views
+#           :f15 - moisture window is time based: raw samples are averaged per reading_interval, the window covers moisture_window seconds
+#           :f16 - average, max deviation and should_water come from O(1) rolling stats instead of rescanning the window
+#           :f17 - pass alarm edges, invalid readings and the start of simulated watering to log_values as events
+#           :f18 - alarm pulse uses the quantized views.pulse() so its icon comes from the sprite cache
+#           :f19 - indicator colors are also available as a precomputed 256 entry lookup table
+#           :f20 - Alarm.animating() tells the render rate governor when the alarm icon pulses
+#           :f21 - no display imports: Alarm is a plain model drawn by MainView, numpy is only loaded for the color LUT
+#           :f22 - ChannelRegistry creates the channels listed in settings.yml instead of a fixed three
+#           :f23 - sensors and pumps come from InputBackend factories; sections with unknown or shared inputs are skipped
 
 import time
 import math
 import threading
 import logging
-from collections import deque
+from sampling import TimeBuckets
 from grow.moisture import Moisture
 from grow.pump import Pump
 from grow import Piezo  # Import Piezo
-from PIL import Image
-from views import View  # Import View class
-from icons import icon_alarm, icon_snooze  # Import icons
 from plant_logging import log_values  # Add this line to import log_values
 
+# Where channels get their moisture sensor and pump. The Grow HAT serves inputs
+# and pumps 1-3; a node with an expander registers a factory for each extra
+# input before the channels are created, e.g.
+#   inputs.register_sensor(4, lambda sensor_id: ExpanderMoisture(sensor_id))
+# A sensor needs what grow's Moisture has: moisture, saturation, active,
+# history, set_wet_point() and set_dry_point(). A pump needs dose().
+class InputBackend:
+    def __init__(self):
+        self._sensors = {}
+        self._pumps = {}
+        for input_id in (1, 2, 3):
+            self.register_sensor(input_id, Moisture)
+            self.register_pump(input_id, Pump)
+
+    def register_sensor(self, sensor_id, factory):
+        self._sensors[sensor_id] = factory
+
+    def register_pump(self, pump_id, factory):
+        self._pumps[pump_id] = factory
+
+    def sensor(self, sensor_id):
+        factory = self._sensors.get(sensor_id)
+        if factory is None:
+            raise ValueError(f"no moisture input {sensor_id}, available are {sorted(self._sensors)}")
+        return factory(sensor_id)
+
+    def pump(self, pump_id):
+        factory = self._pumps.get(pump_id)
+        if factory is None:
+            raise ValueError(f"no pump {pump_id}, available are {sorted(self._pumps)}")
+        return factory(pump_id)
+
+inputs = InputBackend()
+
 class Channel:
     colors = [
         (31, 137, 251),
@@ -69,6 +110,7 @@ class Channel:
         (254, 219, 82),
         (247, 0, 63)
     ]
+    _color_lut = None
 
     def __init__(
         self,
@@ -88,8 +130,8 @@ class Channel:
         enabled=False,
     ):
         self.channel = display_channel
-        self.sensor = Moisture(sensor_channel)
-        self.pump = Pump(pump_channel)
+        self.sensor = inputs.sensor(sensor_channel)
+        self.pump = inputs.pump(pump_channel)
         self.water_level = water_level
         self.warn_level = warn_level
         self.auto_water = auto_water
@@ -104,12 +146,22 @@ class Channel:
         self.alarm = False
         self.title = f"Channel {display_channel}" if title is None else title
 
+        # Last readings taken from the SensorFrame, shared with the views
+        self.moisture = 0.0
+        self.saturation = 0.0
+        self.active = False
+
+        # Previous state, so events are only logged on the edge
+        self._invalid = False
+        self._simulating = False
+
         self.sensor.set_wet_point(wet_point)
         self.sensor.set_dry_point(dry_point)
 
         # Debounce mechanism
-        self.moisture_readings = deque(maxlen=10)  # Store the last 5 readings
-        self.reading_interval = 60  # Interval between readings in seconds
+        self.reading_interval = 60  # Interval between readings in seconds, raw samples are averaged per interval
+        self.moisture_window = 600  # Seconds of readings used for the moving average (10 readings)
+        self.moisture_readings = TimeBuckets(self.reading_interval, self.moisture_window)
         self.large_change_threshold = 10.0  # Threshold for ignoring large changes in percentage
 
     @property
@@ -138,50 +190,42 @@ class Channel:
         self._dry_point = dry_point
         self.sensor.set_dry_point(dry_point)
 
-    def add_moisture_reading(self, reading):
-        if reading == 0 and self.sensor.saturation > self.water_level:
+    def add_moisture_reading(self, reading, timestamp=None):
+        if reading == 0 and self.saturation > self.water_level:
             logging.warning(f"Ignoring invalid reading: {reading}")
             return
-        self.moisture_readings.append(reading)
-        logging.debug(f"Added moisture reading: {reading}, current window: {list(self.moisture_readings)}")
+        if timestamp is None:
+            timestamp = time.monotonic()
+        closed = self.moisture_readings.add(reading, timestamp)
+        if closed is not None:
+            window = self.moisture_readings.window
+            logging.debug(f"Added moisture reading: {closed}, window: {len(window)} readings, mean {window.mean}, min {window.min}, max {window.max}")
 
     def get_moving_average(self):
-        if len(self.moisture_readings) < 2:
-            return self.moisture_readings[0]
-        return sum(self.moisture_readings) / len(self.moisture_readings)
+        return self.moisture_readings.window.mean
 
     def sudden_or_large_change(self):
-        if len(self.moisture_readings) < self.moisture_readings.maxlen:
+        if not self.moisture_readings.full:
             return False  # Not enough data yet
 
-        # Calculate the moving average of the readings
-        moving_average = self.get_moving_average()
-        logging.debug(f"Moving average: {moving_average}")
-
-        # Check for large changes
-        for reading in self.moisture_readings:
-            if abs(reading - moving_average) > self.large_change_threshold:
-                logging.debug(f"Detected large change in reading: {reading}")
-                return True
+        # Largest distance of any reading from the moving average, kept up to date per reading
+        deviation = self.moisture_readings.window.max_deviation
+        if deviation > self.large_change_threshold:
+            logging.debug(f"Detected large change in readings: {deviation} from the moving average")
+            return True
 
         return False
 
     def should_water(self):
-        if len(self.moisture_readings) < self.moisture_readings.maxlen:
+        if not self.moisture_readings.full:
             return False  # Not enough data yet
 
-        # Calculate the moving average of the readings
-        moving_average = self.get_moving_average()
-        logging.debug(f"Moving average: {moving_average}")
-
         # Check for large changes and ignore them
-        for reading in self.moisture_readings:
-            if abs(reading - moving_average) > self.large_change_threshold:
-                logging.debug(f"Ignoring large change in reading: {reading}")
-                return False
+        if self.sudden_or_large_change():
+            return False
 
         # Check if the moving average is below the water level
-        if moving_average < self.water_level:
+        if self.get_moving_average() < self.water_level:
             logging.debug("Watering required based on moving average.")
             return True
 
@@ -189,7 +233,7 @@ class Channel:
 
 
     def warn_color(self):
-        value = self.sensor.moisture
+        value = self.moisture
 
     def indicator_color(self, value):
         value = 1.0 - value
@@ -208,6 +252,31 @@ class Channel:
 
         return (r, g, b)
 
+    @classmethod
+    def color_lut(cls):
+        # indicator_color() for 256 evenly spaced saturations, index with color_index()
+        import numpy  # Only the views need it, headless nodes never load it
+
+        colors = tuple(cls.colors)
+        if cls._color_lut is None or cls._color_lut[0] != colors:
+            lut = numpy.array([cls.indicator_color(cls, i / 255.0) for i in range(256)], dtype=numpy.uint8)
+            cls._color_lut = (colors, lut, [tuple(int(c) for c in color) for color in lut])
+        return cls._color_lut[1]
+
+    @staticmethod
+    def color_index(values, step=1):
+        # step > 1 uses every step'th color only, for palette canvases
+        import numpy
+
+        index = numpy.clip(values * 255 + 0.5, 0, 255).astype(numpy.intp)
+        return index if step == 1 else index // step * step
+
+    def lut_color(self, value, step=1):
+        # Single value lookup, without going through numpy
+        self.color_lut()
+        index = int(min(max(value, 0.0), 1.0) * 255 + 0.5)
+        return self._color_lut[2][index // step * step]
+
     def update_from_yml(self, config):
         if config is not None:
             self.pump_speed = config.get("pump_speed", self.pump_speed)
@@ -275,14 +344,23 @@ Dry point: {dry_point}
         pass
 
     def update(self, context):
+        frame = context.frame
+        self.moisture = frame.moisture_of(self.channel)
+        self.saturation = frame.saturation_of(self.channel)
+        self.active = frame.active_of(self.channel)
+
         if not self.enabled:
             return
-        sat = self.sensor.saturation
-        if sat > self.water_level and self.sensor.moisture == 0:
-            logging.warning(f"Ignoring invalid sensor reading: moisture={self.sensor.moisture}, saturation={sat}")
+        sat = self.saturation
+        if sat > self.water_level and self.moisture == 0:
+            logging.warning(f"Ignoring invalid sensor reading: moisture={self.moisture}, saturation={sat}")
+            if not self._invalid:
+                log_values(self.channel, self.moisture, sat * 100, False, context.light_level, event="invalid")
+            self._invalid = True
             return
+        self._invalid = False
 
-        self.add_moisture_reading(sat)
+        self.add_moisture_reading(sat, frame.timestamp)
         
         watered = False
         simulated_water = False
@@ -298,6 +376,13 @@ Dry point: {dry_point}
             else:
                 simulated_water = True
             
+        events = []
+        if watered:
+            events.append("watered")
+        if simulated_water and not self._simulating:
+            events.append("simulated_water")
+        self._simulating = simulated_water
+
         if sat < self.warn_level:
             if not self.alarm:
                 logging.warning(
@@ -305,24 +390,82 @@ Dry point: {dry_point}
                         self.channel, sat * 100, self.warn_level * 100
                     )
                 )
+                events.append("alarm_on")
             self.alarm = True
         else:
+            if self.alarm:
+                events.append("alarm_off")
             self.alarm = False
 
-        # Log the current state, including whether watering was performed
+        # Log the current state, including whether watering was performed.
+        # Unchanged readings are only written on the heartbeat.
         log_values(
             self.channel,
-            self.sensor.moisture,
+            self.moisture,
             sat * 100,
             watered or simulated_water,
             context.light_level,
-            simulate=simulated_water
+            simulate=simulated_water,
+            event="+".join(events) if events else None
         )
 
 
 
-class Alarm(View):
-    def __init__(self, image, enabled=True, interval=10.0, beep_frequency=440):
+# The channels in use, one per channelN section of settings.yml. Channels are
+# created the first time their section shows up and are kept, in channel
+# order, in one list that the views and the control loop share.
+class ChannelRegistry:
+    default_channels = (1, 2, 3)  # The Grow HAT inputs, used when settings.yml has no channel sections
+
+    def __init__(self):
+        self.channels = []
+        self._by_id = {}
+        self._sensors = {}  # Input id -> channel id using it
+        self._pumps = {}
+
+    def __iter__(self):
+        return iter(self.channels)
+
+    def __len__(self):
+        return len(self.channels)
+
+    def get(self, channel_id):
+        return self._by_id.get(channel_id)
+
+    def sync(self, settings):
+        # Adds channels for new sections and returns them, existing channels are left alone.
+        # A section the inputs can't serve is logged and skipped, it is tried again on the next sync.
+        added = []
+        for channel_id in sorted(settings.channels) or self.default_channels:
+            if channel_id in self._by_id:
+                continue
+            section = settings.channel(channel_id)
+            sensor_channel = channel_id if section is None or section.sensor_channel is None else section.sensor_channel
+            pump_channel = channel_id if section is None or section.pump_channel is None else section.pump_channel
+            try:
+                # Every input and pump belongs to one channel; a second Moisture on a pin fails in add_event_detect
+                for used, input_id, kind in ((self._sensors, sensor_channel, "moisture input"), (self._pumps, pump_channel, "pump")):
+                    if input_id in used:
+                        raise ValueError(f"{kind} {input_id} is already used by channel {used[input_id]}")
+                channel = Channel(channel_id, sensor_channel, pump_channel)
+            except (ValueError, IndexError, RuntimeError) as e:
+                logging.error(f"Skipping channel{channel_id} in settings: {e}")
+                continue
+
+            self._by_id[channel_id] = channel
+            self._sensors[sensor_channel] = channel_id
+            self._pumps[pump_channel] = channel_id
+            added.append(channel)
+
+        if added:
+            self.channels[:] = sorted(self._by_id.values(), key=lambda channel: channel.channel)
+            logging.info(f"Channels in use: {', '.join(str(channel.channel) for channel in self.channels)}")
+        return added
+
+
+# Alarm state and the piezo. How it looks is up to the views (MainView.render_alarm).
+class Alarm:
+    def __init__(self, enabled=True, interval=10.0, beep_frequency=440):
         self.piezo = Piezo()
         self.enabled = enabled
         self.interval = interval
@@ -331,8 +474,6 @@ class Alarm(View):
         self._time_last_beep = time.time()
         self._sleep_until = None
 
-        View.__init__(self, image)
-
     def update_from_yml(self, config):
         if config is not None:
             self.enabled = config.get("alarm_enable", self.enabled)
@@ -367,16 +508,8 @@ class Alarm(View):
 
             self._triggered = False
 
-    def render(self, position=(0, 0)):
-        x, y = position
-        r = 129
-        if self._triggered and self._sleep_until is None:
-            r = int(((math.sin(time.time() * 3 * math.pi) + 1.0) / 2.0) * 128) + 127
-
-        if self._sleep_until is None:
-            self.icon(icon_alarm, (x, y - 1), (r, 129, 129))
-        else:
-            self.icon(icon_snooze, (x, y - 1), (r, 129, 129))
+    def animating(self):
+        return self._triggered and self._sleep_until is None
 
     def trigger(self):
         self._triggered = True
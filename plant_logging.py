@@ -34,28 +34,325 @@
 # ├── hardware.py
 # └── plant_logging.py
 #
-# plant_logging.py : v2-2.5.1.f4 (stable) - refactor C1.0.0
+# plant_logging.py : v2-2.5.1.f10 (stable) - refactor C1.0.0
 # changelog : include a mechanism to track the last watering event and ensure it only logs "Yes" for the actual watering event
 #           : f1 fixing runtime errors
 #           : f2 added simulation logging for auto_water simulation
 #           : f3 fixed sim log
 #           : f4 added the tag (simulated) when auto_water is set to false but water should be given according to the logic.
+#           : f5 emission policy: lines are only written on a heartbeat, when a value leaves its deadband or on an event
+#           : f6 channel log files are written in batches by a background writer thread
+#           : f7 size/day based rotation, rotated segments are gzipped in the background and pruned by retention
+#           : f8 channel loggers are created on first use instead of for a fixed three channels
+#           : f9 resumed files keep their first record time, segment names never collide, retention skips segments waiting for gzip
+#           : f10 retention orders segments by time span and numeric collision suffix
 
+import atexit
+import glob
+import gzip
 import logging
 import os
+import queue
+import re
+import shutil
+import threading
 import time
 
+import metrics
+from constants import LOG_HEARTBEAT_INTERVAL, LOG_MOISTURE_DEADBAND, LOG_SATURATION_DEADBAND, LOG_LIGHT_DEADBAND
+from constants import LOG_QUEUE_SIZE, LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL, LOG_QUEUE_POLICY
+from constants import LOG_MAX_BYTES, LOG_ROTATE_DAILY, LOG_RETENTION_DAYS, LOG_RETENTION_SEGMENTS
+
 # Ensure the /var/log directory exists
 log_dir = "/var/log/plantwatch"
 os.makedirs(log_dir, exist_ok=True)
 
+# Writes log records for all channel files on one background thread, so a slow
+# SD card never stalls the control loop. Records are collected into batches of
+# up to batch_size or flush_interval seconds and each touched file is flushed
+# once per batch. The queue is bounded: with the "drop" policy a full queue
+# drops the new record, with "block" the caller waits up to block_timeout first.
+class LogWriter(threading.Thread):
+    _stop_marker = object()
+
+    def __init__(
+        self,
+        max_queue=LOG_QUEUE_SIZE,
+        batch_size=LOG_BATCH_SIZE,
+        flush_interval=LOG_FLUSH_INTERVAL,
+        policy=LOG_QUEUE_POLICY,
+        block_timeout=0.05,
+    ):
+        super().__init__(name="plantwatch-log-writer", daemon=True)
+        if policy not in ("drop", "block"):
+            raise ValueError(f"Invalid log queue policy {policy}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(max_queue)
+
+    def submit(self, handler, record):
+        try:
+            if self.policy == "block":
+                self._queue.put((handler, record), timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait((handler, record))
+        except queue.Full:
+            self.dropped += 1
+            metrics.incr("log.dropped")
+        metrics.gauge("log.queue_depth", self._queue.qsize())
+
+    def run(self):
+        running = True
+        while running:
+            item = self._queue.get()
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is self._stop_marker:
+                    running = False
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        started = time.monotonic()
+        touched = set()
+        for handler, record in batch:
+            try:
+                handler.write(record)
+                touched.add(handler)
+            except Exception:
+                handler.handleError(record)
+        for handler in touched:
+            handler.flush_stream()
+        self.written += len(batch)
+        metrics.observe("log.write_ms", (time.monotonic() - started) * 1000)
+        metrics.observe("log.batch_size", len(batch))
+        metrics.gauge("log.queue_depth", self._queue.qsize())
+
+    def stop(self, timeout=5.0):
+        # Flush whatever is queued and wait for the writer to finish
+        if self.is_alive():
+            self._queue.put(self._stop_marker)
+            self.join(timeout)
+
+# Compresses rotated segments and applies retention on its own thread, so
+# neither the control loop nor the log writer ever waits for gzip
+class SegmentCompressor(threading.Thread):
+    def __init__(self):
+        super().__init__(name="plantwatch-log-compressor", daemon=True)
+        self._queue = queue.Queue()
+        self._pending = set()  # Segments queued or being compressed, retention leaves them alone
+        self._lock = threading.Lock()
+
+    def submit(self, handler, path):
+        with self._lock:
+            self._pending.add(path)
+        self._queue.put((handler, path))
+
+    def pending(self, path):
+        with self._lock:
+            return path in self._pending
+
+    def run(self):
+        while True:
+            handler, path = self._queue.get()
+            try:
+                started = time.monotonic()
+                with open(path, "rb") as source, gzip.open(path + ".gz.tmp", "wb") as target:
+                    shutil.copyfileobj(source, target)
+                os.replace(path + ".gz.tmp", path + ".gz")
+                os.unlink(path)
+                metrics.observe("log.compress_ms", (time.monotonic() - started) * 1000)
+            except OSError as e:
+                logging.error(f"Unable to compress log segment {path}: {e}")
+                continue
+            finally:
+                with self._lock:
+                    self._pending.discard(path)
+            handler.apply_retention()
+
+# Logging handler that hands records to the LogWriter; the file is only ever
+# opened, written and rotated from the writer thread.
+#
+# The active file keeps its name (plantwatch_channel_1.log). A segment is
+# rotated when it reaches max_bytes or, with rotate_daily, when the first
+# record of a new local day arrives. Rotated segments are named after the
+# first and last record they hold, e.g.
+#   plantwatch_channel_1.20240601T000012-20240601T235950.log.gz
+# so readers can pick a time range from the file names alone. A segment
+# whose name is taken already gets a counter, ...-20240601T235950.1.log.gz
+class QueuedFileHandler(logging.Handler):
+    time_format = "%Y%m%dT%H%M%S"
+
+    def __init__(
+        self,
+        filename,
+        writer,
+        compressor=None,
+        max_bytes=LOG_MAX_BYTES,
+        rotate_daily=LOG_ROTATE_DAILY,
+        retention_days=LOG_RETENTION_DAYS,
+        retention_segments=LOG_RETENTION_SEGMENTS,
+    ):
+        super().__init__()
+        self.filename = os.path.abspath(filename)
+        self.writer = writer
+        self.compressor = compressor
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.retention_days = retention_days
+        self.retention_segments = retention_segments
+        self.stream = None
+        self._size = 0
+        self._first = None
+        self._last = None
+
+        base = os.path.splitext(self.filename)[0]
+        self._segment_prefix = base + "."
+        self._segment_pattern = re.compile(re.escape(os.path.basename(base)) + r"\.(\d{8}T\d{6})-(\d{8}T\d{6})(\.\d+)?\.log(\.gz)?$")
+
+        if self.compressor is not None:
+            # Segments rotated just before a restart may not have been compressed yet
+            for path in sorted(glob.glob(self._segment_prefix + "*.log")):
+                if self._segment_pattern.search(os.path.basename(path)):
+                    self.compressor.submit(self, path)
+
+    def emit(self, record):
+        self.writer.submit(self, record)
+
+    def _open(self):
+        self.stream = open(self.filename, "a", encoding="utf-8")
+        self._size = self.stream.tell()
+        if self._size and self._first is None:
+            # Continuing an existing file: its first line has the first record's time
+            self._last = os.stat(self.filename).st_mtime
+            self._first = self._first_record_time(self._last)
+
+    def _first_record_time(self, default):
+        # Lines start with the formatter's asctime, e.g. "2024-06-01 00:00:12,345 - ..."
+        try:
+            with open(self.filename, encoding="utf-8", errors="replace") as file:
+                line = file.readline()
+            return time.mktime(time.strptime(line[:19], "%Y-%m-%d %H:%M:%S"))
+        except (OSError, ValueError):
+            return default
+
+    def _should_rotate(self, record):
+        if self._first is None:
+            return False
+        if self.max_bytes and self._size >= self.max_bytes:
+            return True
+        if self.rotate_daily:
+            return time.localtime(record.created)[:3] != time.localtime(self._last)[:3]
+        return False
+
+    def rotate(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+        name = "{}{}-{}".format(
+            self._segment_prefix,
+            time.strftime(self.time_format, time.localtime(self._first)),
+            time.strftime(self.time_format, time.localtime(self._last)),
+        )
+        # Two rotations within a second, or after a restart, must not overwrite a segment
+        segment = name + ".log"
+        suffix = 0
+        while os.path.exists(segment) or os.path.exists(segment + ".gz"):
+            suffix += 1
+            segment = f"{name}.{suffix}.log"
+        os.replace(self.filename, segment)
+        self._first = self._last = None
+        self._size = 0
+        metrics.incr("log.rotations")
+
+        if self.compressor is not None:
+            self.compressor.submit(self, segment)
+        else:
+            self.apply_retention()
+
+    def _segment_order(self, path):
+        # Oldest first: by time span, then by collision suffix numerically (.2 before .10)
+        start, end, suffix, _ = self._segment_pattern.search(os.path.basename(path)).groups()
+        return start, end, int(suffix[1:]) if suffix else 0
+
+    def apply_retention(self):
+        segments = sorted(
+            (path for path in glob.glob(self._segment_prefix + "*")
+             if self._segment_pattern.search(os.path.basename(path))
+             and not (self.compressor is not None and self.compressor.pending(path))),
+            key=self._segment_order,
+        )
+        expired = []
+        if self.retention_segments:
+            expired = segments[:-self.retention_segments]
+        if self.retention_days:
+            cutoff = time.strftime(self.time_format, time.localtime(time.time() - self.retention_days * 86400))
+            for path in segments:
+                end = self._segment_pattern.search(os.path.basename(path)).group(2)
+                if end < cutoff and path not in expired:
+                    expired.append(path)
+        for path in expired:
+            try:
+                os.unlink(path)
+            except OSError as e:
+                logging.error(f"Unable to remove old log segment {path}: {e}")
+
+    def write(self, record):
+        if self.stream is None:
+            self._open()
+        if self._should_rotate(record):
+            self.rotate()
+            self._open()
+
+        line = self.format(record) + "\n"
+        self.stream.write(line)
+        self._size += len(line)
+        if self._first is None:
+            self._first = record.created
+        self._last = record.created
+
+    def flush_stream(self):
+        if self.stream is not None:
+            self.stream.flush()
+
+    def close(self):
+        self.acquire()
+        try:
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+        finally:
+            self.release()
+        super().close()
+
+log_writer = LogWriter()
+log_writer.start()
+atexit.register(log_writer.stop)
+
+log_compressor = SegmentCompressor()
+log_compressor.start()
+
 # Function to set up logging for a specific channel
 def setup_channel_logger(channel_id):
     logger = logging.getLogger(f"Channel{channel_id}")
     logger.setLevel(logging.INFO)
     log_path = os.path.join(log_dir, f"plantwatch_channel_{channel_id}.log")
     
-    handler = logging.FileHandler(log_path)
+    handler = QueuedFileHandler(log_path, log_writer, log_compressor)
     handler.setLevel(logging.INFO)
     
     formatter = logging.Formatter('%(asctime)s - %(message)s')
@@ -66,12 +363,71 @@ def setup_channel_logger(channel_id):
     
     return logger
 
-# Setting up loggers for each channel
-channel_loggers = {i: setup_channel_logger(i) for i in range(1, 4)}
-last_watered_times = {i: None for i in range(1, 4)}
+# Channel loggers are set up on their first line, so only channels in use get a log file
+channel_loggers = {}
+last_watered_times = {}
+
+def channel_logger(channel_id):
+    logger = channel_loggers.get(channel_id)
+    if logger is None:
+        logger = channel_loggers[channel_id] = setup_channel_logger(channel_id)
+    return logger
+
+# Decides per channel whether a line is worth writing. Values are compared with
+# the last line that was actually written, so slow drifts still get logged once
+# they add up to more than the deadband.
+class EmissionPolicy:
+    def __init__(
+        self,
+        heartbeat=LOG_HEARTBEAT_INTERVAL,
+        moisture_deadband=LOG_MOISTURE_DEADBAND,
+        saturation_deadband=LOG_SATURATION_DEADBAND,
+        light_deadband=LOG_LIGHT_DEADBAND,
+    ):
+        self.heartbeat = heartbeat
+        self.moisture_deadband = moisture_deadband
+        self.saturation_deadband = saturation_deadband
+        self.light_deadband = light_deadband
+        self.emitted = 0
+        self.suppressed = 0
+        self._last = {}
+
+    def _outside(self, value, last, deadband):
+        if value is None or last is None:
+            return value is not last
+        return abs(value - last) > deadband
+
+    def should_emit(self, channel_id, moisture, saturation, light, event=None):
+        now = time.monotonic()
+        last = self._last.get(channel_id)
+
+        if (
+            event is not None
+            or last is None
+            or now - last[0] >= self.heartbeat
+            or self._outside(moisture, last[1], self.moisture_deadband)
+            or self._outside(saturation, last[2], self.saturation_deadband)
+            or self._outside(light, last[3], self.light_deadband)
+        ):
+            self._last[channel_id] = (now, moisture, saturation, light)
+            self.emitted += 1
+            metrics.incr("log.emitted")
+            return True
+
+        self.suppressed += 1
+        metrics.incr("log.suppressed")
+        return False
+
+emission_policy = EmissionPolicy()
+
+def log_values(channel_id, soil_moisture_abs, soil_moisture_percent, water_given, light_level, simulate=False, event=None):
+    if event is None and water_given and not simulate:
+        event = "watered"
+
+    if not emission_policy.should_emit(channel_id, soil_moisture_abs, soil_moisture_percent, light_level, event):
+        return
 
-def log_values(channel_id, soil_moisture_abs, soil_moisture_percent, water_given, light_level, simulate=False):
-    logger = channel_loggers[channel_id]
+    logger = channel_logger(channel_id)
     water_status = "Yes" if water_given else "No"
     if simulate:
         water_status += " (simulated)"
@@ -79,11 +435,13 @@ def log_values(channel_id, soil_moisture_abs, soil_moisture_percent, water_given
     # Check if the water was given and it is a new event
     if water_given and not simulate:
         last_watered_times[channel_id] = time.time()
-    elif last_watered_times[channel_id] and time.time() - last_watered_times[channel_id] < 600:  # 600 seconds = 10 minutes
+    elif last_watered_times.get(channel_id) and time.time() - last_watered_times[channel_id] < 600:  # 600 seconds = 10 minutes
         water_status = "No"
         
     message = (f"soil moisture (abs): {soil_moisture_abs}, "
                f"soil moisture (%): {soil_moisture_percent:.2f}, "
                f"water given: {water_status}, "
                f"light level: {light_level}")
+    if event is not None:
+        message += f", event: {event}"
     logger.info(message)
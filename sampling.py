@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+#    ___     _                                         
+#   / _ \___| |_ ___ _ __                              
+#  / /_)/ _ \ __/ _ \ '__|                             
+# / ___/  __/ ||  __/ |                                
+# \/    \___|\__\___|_|                                                                                 
+#    ___ _             _   __    __      _       _     
+#   / _ \ | __ _ _ __ | |_/ / /\ \ \__ _| |_ ___| |__  
+#  / /_)/ |/ _` | '_ \| __\ \/  \/ / _` | __/ __| '_ \ 
+# / ___/| | (_| | | | | |_ \  /\  / (_| | || (__| | | |
+# \/    |_|\__,_|_| |_|\__| \/  \/ \__,_|\__\___|_| |_|
+#                       .: auto-grow the greens yo :.                          
+#
+# Automated plant monitoring and watering system
+#
+# hardware platform  : Raspberry Pi Zero W
+# HAT                : Pimoroni Grow Hat Mini
+# Water drivers      : COM3700 Mini submersible water pump
+# Sensors            : Capacitive Soil moisture sensor with PFM output
+#                    : BME280 Temperature, Humidity, Air pressure
+#                    : LTR-559 light and proximity sensor 
+# Codebase           : Python3
+#
+# (2024) JinjiroSan
+#
+# PeterPlantwatch/
+# ├── main.py
+# ├── config.py
+# ├── views.py
+# ├── controllers.py
+# ├── models.py
+# ├── icons.py
+# ├── constants.py
+# ├── hardware.py
+# ├── plant_logging.py
+# ├── metrics.py
+# ├── scheduler.py
+# ├── buttons.py
+# ├── benchmark.py
+# └── sampling.py
+#
+# sampling.py : v1-1.0.f2 (stable)
+# changelog : f1 - added RollingStats, the bucket window keeps O(1) mean/variance/min/max
+#           : f2 - empty buckets age the window, means older than window_seconds are dropped after a gap
+
+from collections import deque
+
+
+# Fixed size sliding window with O(1) mean/variance (Welford, with removal of
+# the value that drops out) and amortized O(1) min/max (monotonic deques), so
+# asking for the average or the largest deviation never rescans the window.
+class RollingStats:
+    def __init__(self, maxlen):
+        if maxlen < 1:
+            raise ValueError("RollingStats needs room for at least one value")
+        self.maxlen = maxlen
+        self._values = deque()
+        self._pushed = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._min = deque()  # (position, value), values increasing
+        self._max = deque()  # (position, value), values decreasing
+
+    def append(self, value):
+        if len(self._values) == self.maxlen:
+            self._evict()
+
+        position = self._pushed
+        self._pushed += 1
+        self._values.append(value)
+
+        delta = value - self._mean
+        self._mean += delta / len(self._values)
+        self._m2 += delta * (value - self._mean)
+
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((position, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((position, value))
+
+    def _evict(self):
+        position = self._pushed - len(self._values)
+        value = self._values.popleft()
+        count = len(self._values)
+        if count == 0:
+            self._mean = 0.0
+            self._m2 = 0.0
+        else:
+            delta = value - self._mean
+            self._mean -= delta / count
+            self._m2 = max(0.0, self._m2 - delta * (value - self._mean))
+
+        if self._min[0][0] == position:
+            self._min.popleft()
+        if self._max[0][0] == position:
+            self._max.popleft()
+
+    @property
+    def mean(self):
+        return self._mean
+
+    @property
+    def sum(self):
+        return self._mean * len(self._values)
+
+    @property
+    def variance(self):
+        return self._m2 / len(self._values) if self._values else 0.0
+
+    @property
+    def stdev(self):
+        return self.variance ** 0.5
+
+    @property
+    def min(self):
+        return self._min[0][1]
+
+    @property
+    def max(self):
+        return self._max[0][1]
+
+    @property
+    def max_deviation(self):
+        # Largest distance of any value in the window from the window mean
+        return max(self.max - self._mean, self._mean - self.min)
+
+    def drop(self, count):
+        # Removes the count oldest values
+        for _ in range(min(count, len(self._values))):
+            self._evict()
+
+    def clear(self):
+        self._values.clear()
+        self._min.clear()
+        self._max.clear()
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __getitem__(self, index):
+        return self._values[index]
+
+
+# Aggregates raw samples into fixed time buckets and keeps the bucket means for
+# the last `window_seconds`. Only the running sum/count of the open bucket is
+# stored, so a window of hours costs a few hundred floats no matter how often
+# the sensor is sampled. Buckets without samples hold no value but still age
+# the window, so means from before a gap drop out once they are too old.
+class TimeBuckets:
+    def __init__(self, bucket_seconds, window_seconds):
+        if bucket_seconds <= 0 or window_seconds < bucket_seconds:
+            raise ValueError("Window must hold at least one bucket of a positive duration")
+        self.bucket_seconds = bucket_seconds
+        self.window_seconds = window_seconds
+        self.window = RollingStats(int(window_seconds // bucket_seconds))
+        self._bucket_start = None
+        self._sum = 0.0
+        self._count = 0
+
+    @property
+    def maxlen(self):
+        return self.window.maxlen
+
+    @property
+    def full(self):
+        return len(self.window) == self.window.maxlen
+
+    def add(self, value, timestamp):
+        # Returns the mean of the bucket that was closed by this sample, if any
+        closed = None
+        if self._bucket_start is None:
+            self._bucket_start = timestamp
+        elif timestamp - self._bucket_start >= self.bucket_seconds:
+            closed = self._close()
+            # Keep the buckets aligned; buckets without any samples push out as many old means
+            elapsed = int((timestamp - self._bucket_start) // self.bucket_seconds)
+            self._bucket_start += elapsed * self.bucket_seconds
+            if elapsed > 1:
+                self.window.drop(elapsed - 1)
+
+        self._sum += value
+        self._count += 1
+        return closed
+
+    def _close(self):
+        mean = self._sum / self._count
+        self.window.append(mean)
+        self._sum = 0.0
+        self._count = 0
+        return mean
+
+    def clear(self):
+        self.window.clear()
+        self._bucket_start = None
+        self._sum = 0.0
+        self._count = 0
+
+    def __len__(self):
+        return len(self.window)
+
+    def __iter__(self):
+        return iter(self.window)
+
+    def __getitem__(self, index):
+        return self.window[index]
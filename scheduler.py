@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+#    ___     _                                         
+#   / _ \___| |_ ___ _ __                              
+#  / /_)/ _ \ __/ _ \ '__|                             
+# / ___/  __/ ||  __/ |                                
+# \/    \___|\__\___|_|                                                                                 
+#    ___ _             _   __    __      _       _     
+#   / _ \ | __ _ _ __ | |_/ / /\ \ \__ _| |_ ___| |__  
+#  / /_)/ |/ _` | '_ \| __\ \/  \/ / _` | __/ __| '_ \ 
+# / ___/| | (_| | | | | |_ \  /\  / (_| | || (__| | | |
+# \/    |_|\__,_|_| |_|\__| \/  \/ \__,_|\__\___|_| |_|
+#                       .: auto-grow the greens yo :.                          
+#
+# Automated plant monitoring and watering system
+#
+# hardware platform  : Raspberry Pi Zero W
+# HAT                : Pimoroni Grow Hat Mini
+# Water drivers      : COM3700 Mini submersible water pump
+# Sensors            : Capacitive Soil moisture sensor with PFM output
+#                    : BME280 Temperature, Humidity, Air pressure
+#                    : LTR-559 light and proximity sensor 
+# Codebase           : Python3
+#
+# (2024) JinjiroSan
+#
+# PeterPlantwatch/
+# ├── main.py
+# ├── config.py
+# ├── views.py
+# ├── controllers.py
+# ├── models.py
+# ├── icons.py
+# ├── constants.py
+# ├── hardware.py
+# ├── plant_logging.py
+# ├── metrics.py
+# └── scheduler.py
+#
+# scheduler.py : v1-1.0.f2 (stable)
+# changelog : f1 - task periods can change at runtime, RateGovernor picks the render rate from UI activity
+#           : f2 - RateGovernor times frames with the render thread's CPU clock
+
+import logging
+import time
+
+import metrics
+
+
+# A periodic job with its own period, deadline and overrun accounting.
+# The next run is computed from the previous *scheduled* time rather than from
+# when the job finished, so the cadence does not drift. When the loop falls
+# behind by more than a period the missed slots are skipped (and counted)
+# instead of being run back to back.
+class Task:
+    def __init__(self, name, callback, period, deadline=None, offset=0.0):
+        if period <= 0:
+            raise ValueError(f"Task {name} needs a positive period")
+        self.name = name
+        self.callback = callback
+        self.period = period
+        self.deadline = period if deadline is None else deadline
+        self.offset = offset
+        self.next_run = None
+
+        self.runs = 0
+        self.overruns = 0
+        self.missed = 0
+        self.total_runtime = 0.0
+        self.max_runtime = 0.0
+        self.max_lateness = 0.0
+
+    def run(self, now, clock, advance=True):
+        lateness = max(0.0, now - self.next_run)
+        started = clock()
+        try:
+            self.callback()
+        finally:
+            runtime = clock() - started
+            self.runs += 1
+            self.total_runtime += runtime
+            self.max_runtime = max(self.max_runtime, runtime)
+            self.max_lateness = max(self.max_lateness, lateness)
+            if runtime > self.deadline:
+                self.overruns += 1
+                logging.debug(
+                    f"Task {self.name} overran its deadline: {runtime * 1000:.1f}ms > {self.deadline * 1000:.1f}ms"
+                )
+            if advance:
+                self._advance(clock())
+
+    def set_period(self, period, now):
+        # Change the rate; the next run is no later than one new period from now
+        if period <= 0:
+            raise ValueError(f"Task {self.name} needs a positive period")
+        self.period = period
+        if self.next_run is not None:
+            self.next_run = min(self.next_run, now + period)
+
+    def _advance(self, now):
+        self.next_run += self.period
+        if self.next_run <= now:
+            behind = int((now - self.next_run) // self.period) + 1
+            self.missed += behind
+            self.next_run += behind * self.period
+
+    @property
+    def mean_runtime(self):
+        return self.total_runtime / self.runs if self.runs else 0.0
+
+    def __str__(self):
+        return (
+            "{name}: period {period:.3f}s, runs {runs}, mean {mean:.2f}ms, max {max:.2f}ms, "
+            "overruns {overruns}, missed {missed}, max late {late:.2f}ms"
+        ).format(
+            name=self.name,
+            period=self.period,
+            runs=self.runs,
+            mean=self.mean_runtime * 1000,
+            max=self.max_runtime * 1000,
+            overruns=self.overruns,
+            missed=self.missed,
+            late=self.max_lateness * 1000,
+        )
+
+
+# Runs registered tasks in registration order whenever they are due
+class Scheduler:
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.tasks = []
+        self._start = None
+
+    def add(self, name, callback, period, deadline=None, offset=0.0):
+        task = Task(name, callback, period, deadline=deadline, offset=offset)
+        if self._start is not None:
+            task.next_run = self.clock() + offset
+        self.tasks.append(task)
+        return task
+
+    def get(self, name):
+        for task in self.tasks:
+            if task.name == name:
+                return task
+        raise KeyError(name)
+
+    def start(self):
+        self._start = self.clock()
+        for task in self.tasks:
+            task.next_run = self._start + task.offset
+
+    def run_pending(self):
+        # Run every task that is due and return the seconds until the next one
+        if self._start is None:
+            self.start()
+
+        for task in self.tasks:
+            now = self.clock()
+            if now >= task.next_run:
+                task.run(now, self.clock)
+
+        return max(0.0, min(task.next_run for task in self.tasks) - self.clock())
+
+    def run_now(self, name):
+        # Run a task out of band (e.g. a re-render after input) without shifting its cadence
+        if self._start is None:
+            self.start()
+        self.get(name).run(self.clock(), self.clock, advance=False)
+
+    def set_period(self, name, period):
+        task = self.get(name)
+        if task.period != period:
+            task.set_period(period, self.clock())
+
+    def run(self, wait=time.sleep):
+        while True:
+            wait(self.run_pending())
+
+    def publish(self):
+        for task in self.tasks:
+            metrics.gauge(f"task.{task.name}.runs", task.runs)
+            metrics.gauge(f"task.{task.name}.overruns", task.overruns)
+            metrics.gauge(f"task.{task.name}.missed", task.missed)
+            metrics.gauge(f"task.{task.name}.mean_ms", round(task.mean_runtime * 1000, 3))
+            metrics.gauge(f"task.{task.name}.max_ms", round(task.max_runtime * 1000, 3))
+
+    def report(self, logger=None):
+        logger = logger or logging.getLogger("scheduler")
+        self.publish()
+        for task in self.tasks:
+            logger.info(str(task))
+
+
+# Picks the render period from UI activity: the full rate for active_time
+# seconds after input or while something on screen animates, a slow idle
+# rate that still refreshes the readouts otherwise
+class RateGovernor:
+    def __init__(self, active_period, idle_period, active_time, clock=time.monotonic, cpu_clock=time.thread_time):
+        self.active_period = active_period
+        self.idle_period = idle_period
+        self.active_time = active_time
+        self.clock = clock
+        # CPU time of the rendering thread only, so SPI, log and gzip work on
+        # other threads never makes rendering look expensive
+        self.cpu_clock = cpu_clock
+        self._frame_started = None
+        self.frames = 0
+        self.cpu_time = 0.0
+        self._active_until = clock() + active_time
+        self._published = (clock(), 0, 0.0)
+
+    def activity(self):
+        self._active_until = self.clock() + self.active_time
+
+    def period(self, animating=False):
+        if animating or self.clock() < self._active_until:
+            return self.active_period
+        return self.idle_period
+
+    def frame_started(self):
+        self._frame_started = self.cpu_clock()
+
+    def frame(self):
+        # Ends the frame begun by frame_started() and returns its CPU time
+        cpu_time = self.cpu_clock() - self._frame_started
+        self.frames += 1
+        self.cpu_time += cpu_time
+        return cpu_time
+
+    def publish(self):
+        # Frame rate and share of CPU spent rendering since the last publish
+        now = self.clock()
+        then, frames, cpu_time = self._published
+        elapsed = now - then
+        if elapsed > 0:
+            metrics.gauge("render.fps", round((self.frames - frames) / elapsed, 2))
+            metrics.gauge("render.cpu_percent", round((self.cpu_time - cpu_time) / elapsed * 100, 2))
+        self._published = (now, self.frames, self.cpu_time)
@@ -0,0 +1,40 @@
+from sampling import TimeBuckets
+
+
+def fill(buckets, start, count, value=0.5):
+    # One sample per bucket, the next bucket's sample closes it
+    for i in range(count):
+        buckets.add(value, start + i * buckets.bucket_seconds)
+    return start + count * buckets.bucket_seconds
+
+
+def test_window_fills_one_mean_per_bucket():
+    buckets = TimeBuckets(60, 600)
+    fill(buckets, 0, 11)
+    assert len(buckets) == 10
+    assert buckets.full
+
+
+def test_gap_longer_than_window_drops_old_means():
+    buckets = TimeBuckets(60, 600)
+    end = fill(buckets, 0, 11, value=0.2)
+    assert buckets.full
+
+    # Hours without samples (channel disabled, readings invalid, power off)
+    buckets.add(0.8, end + 3 * 3600)
+    assert len(buckets) == 0
+    assert not buckets.full
+
+    fill(buckets, end + 3 * 3600 + 60, 10, value=0.8)
+    assert buckets.full
+    assert buckets.window.mean == 0.8
+
+
+def test_short_gap_ages_the_window():
+    buckets = TimeBuckets(60, 600)
+    end = fill(buckets, 0, 11)
+
+    # The open bucket closes and three empty buckets push out three old means
+    buckets.add(0.5, end + 3 * 60)
+    assert len(buckets) == 10 - 3
+    assert not buckets.full
@@ -34,43 +34,449 @@
 # ├── hardware.py
 # └── plant_logging.py
 #
-# views.py : v2-2.5 (stable) - refactor C1.0.0
-
-from PIL import Image, ImageDraw, ImageFont
+# views.py : v2-2.5.f15 (stable) - refactor C1.0.0
+# changelog : f1 - draw the readings of the last SensorFrame kept on the channel instead of reading the sensor
+#           : f2 - ChannelEditView initialises EditView with its options (they were lost through the ChannelView MRO)
+#           : f3 - tinted icons come from a bounded LRU sprite cache, animated colours are quantized
+#           : f4 - views declare a static layer that is rendered once into a cached base image
+#           : f5 - text is drawn from a cache of rendered strings, numbers are composed from a glyph atlas
+#           : f6 - text_in_rect() layouts are memoized, font size is found by binary search
+#           : f7 - fonts come from a shared registry and are loaded on first use
+#           : f8 - detail graph is drawn as one array operation, graph and bar colors come from the channel color LUT
+#           : f9 - views can draw into a palette ("P") canvas
+#           : f10 - views say when they animate, so the render rate can drop when nothing moves
+#           : f11 - MainView draws the alarm icon itself, Alarm is no longer a View
+#           : f12 - home screen lays out any number of channels, paged with Y when they don't fit, layouts are cached per channel count
+#           : f13 - composed glyphs sit at FreeType's pen positions (kerning, fractional advances), getbbox instead of the removed getsize
+#           : f14 - glyph advances and kerning pairs are cached, composing a string no longer lays out every prefix
+#           : f15 - channel edit buttons reach the editor instead of ChannelView's no-ops
+
+from PIL import Image, ImageChops, ImageDraw, ImageFont
 import math
 import time
+import numpy
+from collections import OrderedDict
+import metrics
 from constants import DISPLAY_WIDTH, DISPLAY_HEIGHT, COLOR_WHITE, COLOR_BLUE, COLOR_GREEN, COLOR_YELLOW, COLOR_RED, COLOR_BLACK
 from fonts.ttf import RobotoMedium as UserFont
 from icons import icon_drop, icon_nodrop, icon_rightarrow, icon_alarm, icon_snooze, icon_help, icon_settings, icon_channel, icon_backdrop, icon_return
 
+# Tinted, rotated icons ready to paste, keyed by (icon, rotation, color).
+# Each entry is a solid color tile plus the icon's alpha as paste mask, so a
+# cache hit draws with a single paste and allocates nothing.
+class SpriteCache:
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._sprites = OrderedDict()
+
+    def get(self, icon, rotation, color):
+        key = (id(icon), rotation, color)
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite[0], sprite[1]
+
+        self.misses += 1
+        mask = (icon.rotate(rotation) if rotation else icon).getchannel("A")
+        tile = Image.new("RGB", mask.size, color=color)
+        # Keep a reference to the icon so its id can't be reused while cached
+        self._sprites[key] = (tile, mask, icon)
+        if len(self._sprites) > self.maxsize:
+            self._sprites.popitem(last=False)
+        return tile, mask
+
+    def binary(self, icon, rotation):
+        # Thresholded alpha for palette ("P") canvases, where blending would mix palette indices
+        key = (id(icon), rotation, "1")
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite[0]
+
+        self.misses += 1
+        mask = (icon.rotate(rotation) if rotation else icon).getchannel("A").point(lambda a: 255 if a >= 128 else 0, "1")
+        self._sprites[key] = (mask, icon)
+        if len(self._sprites) > self.maxsize:
+            self._sprites.popitem(last=False)
+        return mask
+
+    def publish(self):
+        metrics.gauge("sprites.hits", self.hits)
+        metrics.gauge("sprites.misses", self.misses)
+        metrics.gauge("sprites.size", len(self._sprites))
+
+sprites = SpriteCache()
+metrics.collector(sprites.publish)
+
+# Rendered text as paste masks so steady-state frames never go through FreeType.
+# Strings are cached whole. Anything with digits in it is likely to change
+# every frame, so on a miss it is composed from a per-font glyph atlas rather
+# than rendered: glyphs are placed at their advances and merged with max(),
+# which is what FreeType's own layout does.
+class TextCache:
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.glyph_hits = 0
+        self.glyph_misses = 0
+        self.renders = 0
+        self.layouts = 0
+        self._strings = OrderedDict()
+        self._glyphs = {}
+        self._advances = {}
+        self._kerning = {}
+        self._sizes = {}
+
+    def _render(self, font, text):
+        self.renders += 1
+        left, top, right, bottom = font.getbbox(text)
+        mask = Image.new("L", (max(1, right - left), max(1, bottom - top)))
+        ImageDraw.Draw(mask).text((-left, -top), text, font=font, fill=255)
+        return left, top, mask
+
+    def glyph(self, font, char):
+        key = (font.path, font.size, char)
+        glyph = self._glyphs.get(key)
+        if glyph is not None:
+            self.glyph_hits += 1
+            return glyph
+
+        self.glyph_misses += 1
+        glyph = self._glyphs[key] = self._render(font, char)
+        return glyph
+
+    def _length(self, font, text):
+        self.layouts += 1
+        return font.getlength(text)
+
+    def advance(self, font, char):
+        key = (font.path, font.size, char)
+        advance = self._advances.get(key)
+        if advance is None:
+            advance = self._advances[key] = self._length(font, char)
+        return advance
+
+    def kerning(self, font, pair):
+        # What a pair adds to (or takes from) the two advances on their own
+        key = (font.path, font.size, pair)
+        kerning = self._kerning.get(key)
+        if kerning is None:
+            kerning = self._length(font, pair) - self.advance(font, pair[0]) - self.advance(font, pair[1])
+            self._kerning[key] = kerning
+        return kerning
+
+    def _compose(self, font, text):
+        # Each glyph goes where FreeType puts it in the whole string: at the
+        # rounded sum of the advances and kerning before it. Advances come in
+        # 1/64 px, so the sum is exact and keeps every fractional part.
+        # Advances and pairs are cached, a miss on a known alphabet lays out nothing
+        placed = []
+        pen = 0.0
+        for i, char in enumerate(text):
+            if i:
+                pen += self.advance(font, text[i - 1]) + self.kerning(font, text[i - 1:i + 1])
+            if char == " ":
+                continue
+            left, top, mask = self.glyph(font, char)
+            placed.append((int(pen + 0.5) + left, top, mask))
+
+        if not placed:
+            return 0, 0, Image.new("L", (1, 1))
+
+        left = min(x for x, y, mask in placed)
+        top = min(y for x, y, mask in placed)
+        right = max(x + mask.size[0] for x, y, mask in placed)
+        bottom = max(y + mask.size[1] for x, y, mask in placed)
+        canvas = Image.new("L", (right - left, bottom - top))
+        for x, y, mask in placed:
+            box = (x - left, y - top, x - left + mask.size[0], y - top + mask.size[1])
+            canvas.paste(ImageChops.lighter(canvas.crop(box), mask), box)
+        return left, top, canvas
+
+    def string(self, font, text):
+        key = (font.path, font.size, text)
+        entry = self._strings.get(key)
+        if entry is not None:
+            self._strings.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        if any(char.isdigit() for char in text):
+            entry = self._compose(font, text)
+        else:
+            entry = self._render(font, text)
+        self._strings[key] = entry
+        if len(self._strings) > self.maxsize:
+            self._strings.popitem(last=False)
+        return entry
+
+    def binary(self, font, text):
+        # Thresholded mask for palette ("P") canvases
+        key = (font.path, font.size, text, "1")
+        entry = self._strings.get(key)
+        if entry is not None:
+            self._strings.move_to_end(key)
+            return entry
+
+        left, top, mask = self.string(font, text)
+        entry = (left, top, mask.point(lambda a: 255 if a >= 128 else 0, "1"))
+        self._strings[key] = entry
+        if len(self._strings) > self.maxsize:
+            self._strings.popitem(last=False)
+        return entry
+
+    def size(self, font, text):
+        key = (font.path, font.size, text)
+        size = self._sizes.get(key)
+        if size is None:
+            left, top, right, bottom = font.getbbox(text)
+            size = self._sizes[key] = (right, bottom)
+        return size
+
+    def draw(self, image, position, text, font, fill):
+        left, top, mask = self.string(font, text)
+        x, y = position[0] + left, position[1] + top
+        image.paste(fill, (x, y, x + mask.size[0], y + mask.size[1]), mask)
+
+    def publish(self):
+        metrics.gauge("text.hits", self.hits)
+        metrics.gauge("text.misses", self.misses)
+        metrics.gauge("text.glyph_hits", self.glyph_hits)
+        metrics.gauge("text.glyph_misses", self.glyph_misses)
+        metrics.gauge("text.freetype_renders", self.renders)
+        metrics.gauge("text.freetype_layouts", self.layouts)
+        metrics.gauge("text.size", len(self._strings))
+
+text_cache = TextCache()
+metrics.collector(text_cache.publish)
+
+# Every (font file, size) pair is loaded once and shared by all views, on
+# first use rather than when a view is constructed
+class FontRegistry:
+    def __init__(self):
+        self.loads = 0
+        self._fonts = {}
+
+    def get(self, path, size):
+        font = self._fonts.get((path, size))
+        if font is None:
+            self.loads += 1
+            font = self._fonts[(path, size)] = ImageFont.truetype(path, size)
+        return font
+
+    def publish(self):
+        metrics.gauge("fonts.loaded", self.loads)
+
+fonts = FontRegistry()
+metrics.collector(fonts.publish)
+
+# Word-wrapped, centered text layouts keyed by (text, font, rect, line spacing).
+# The font size is the largest that fits, found by binary search.
+class TextLayout:
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._layouts = OrderedDict()
+
+    def wrap(self, words, font, width, max_lines):
+        # Greedy wrap using word advances, so every word is measured once
+        space = font.getlength(" ")
+        lines = []
+        line = []
+        line_width = 0
+        for word in words:
+            word_width = font.getlength(word)
+            if line and line_width + space + word_width <= width:
+                line.append(word)
+                line_width += space + word_width
+                continue
+            if line:
+                lines.append(" ".join(line))
+            if word_width > width or len(lines) == max_lines:
+                return None
+            line = [word]
+            line_width = word_width
+        if line:
+            lines.append(" ".join(line))
+        return lines
+
+    def fit(self, text, font, rect, line_spacing):
+        x1, y1, x2, y2 = rect
+        width, height = x2 - x1, y2 - y1
+        words = text.split(" ")
+
+        best = None
+        low, high = 1, font.size
+        while low <= high:
+            size = (low + high) // 2
+            candidate = fonts.get(font.path, size)
+            line_height = int(size * line_spacing)
+            lines = self.wrap(words, candidate, width, math.floor(height / line_height)) if line_height > 0 else None
+            if lines is None:
+                high = size - 1
+            else:
+                best = (candidate, lines, line_height)
+                low = size + 1
+
+        if best is None:
+            return None
+
+        font, lines, line_height = best
+        y = int(y1 + (height / 2) - (len(lines) * line_height / 2) - (line_height - font.size) / 2)
+        bounds = [x2, y, x1, y + len(lines) * line_height]
+        placed = []
+        for line in lines:
+            line_width = font.getbbox(line)[2]
+            x = int(x1 + (width / 2) - (line_width / 2))
+            bounds[0] = min(bounds[0], x)
+            bounds[2] = max(bounds[2], x + line_width)
+            placed.append((x, y, line))
+            y += line_height
+        return font, placed, tuple(bounds)
+
+    def get(self, text, font, rect, line_spacing=1.1):
+        key = (text, font.path, font.size, tuple(rect), line_spacing)
+        fitted = self._layouts.get(key, False)
+        if fitted is not False:
+            self._layouts.move_to_end(key)
+            self.hits += 1
+            return fitted
+
+        self.misses += 1
+        fitted = self.fit(text, font, rect, line_spacing)
+        self._layouts[key] = fitted
+        if len(self._layouts) > self.maxsize:
+            self._layouts.popitem(last=False)
+        return fitted
+
+    def publish(self):
+        metrics.gauge("layout.hits", self.hits)
+        metrics.gauge("layout.misses", self.misses)
+        metrics.gauge("layout.size", len(self._layouts))
+
+layouts = TextLayout()
+metrics.collector(layouts.publish)
+
+# Home screen bar positions for a channel count, worked out once per count.
+# Bars share the space between the two backdrops and are never narrower than
+# a channel label; when they don't fit the channels are split into pages of
+# equal size. Channel i is drawn on page i // per_page at xs[i % per_page].
+class BarLayout:
+    def __init__(self, left=33, right=127, margin=2, min_width=16, max_width=30):
+        self.left = left
+        self.right = right
+        self.margin = margin
+        self.min_width = min_width
+        self.max_width = max_width
+        self._layouts = {}
+
+    def fit(self, count):
+        width = self.right - self.left
+        count = max(1, count)
+        per_page = max(1, min(count, (width + self.margin) // (self.min_width + self.margin)))
+        pages = math.ceil(count / per_page)
+        per_page = math.ceil(count / pages)
+
+        bar_width = min(self.max_width, (width + self.margin) // per_page - self.margin)
+        total = per_page * (bar_width + self.margin) - self.margin
+        x = self.left + (width - total) // 2
+        xs = tuple(x + i * (bar_width + self.margin) for i in range(per_page))
+        return bar_width, per_page, pages, xs
+
+    def get(self, count):
+        layout = self._layouts.get(count)
+        if layout is None:
+            layout = self._layouts[count] = self.fit(count)
+        return layout
+
+bar_layouts = BarLayout()
+
+# Gradient colors on palette canvases use every PALETTE_STEP'th LUT entry, so
+# the graph and bars add at most 256 / PALETTE_STEP colors to the palette
+PALETTE_STEP = 8
+
+# Brightness of the pulsing alarm colour, quantized so it only ever needs a
+# handful of cached sprites
+def pulse(step=8):
+    value = int(((math.sin(time.time() * 3 * math.pi) + 1.0) / 2.0) * 128) + 127
+    return min(255, (value // step) * step + step - 1)
+
 class View:
     def __init__(self, image):
         self._image = image
         self._draw = ImageDraw.Draw(image)
-        self.font = ImageFont.truetype(UserFont, 14)
-        self.font_small = ImageFont.truetype(UserFont, 10)
+        # Palette canvases can't blend, icons and text are drawn with hard edges
+        self._palette = image.mode == "P"
+        self._static = None
+        self._static_key = None
+
+    @property
+    def font(self):
+        return fonts.get(UserFont, 14)
+
+    @property
+    def font_small(self):
+        return fonts.get(UserFont, 10)
 
     def update(self): pass
     def render(self): pass
+    def animating(self): return False  # True asks for the full frame rate
     def clear(self):
         self._draw.rectangle((0, 0, DISPLAY_WIDTH, DISPLAY_HEIGHT), fill=COLOR_BLACK)
 
-    def icon(self, icon, position, color):
-        col = Image.new("RGBA", icon.size, color=color)
-        self._image.paste(col, position, mask=icon)
+    # Everything that only changes with static_key() goes in render_static().
+    # Only put things there that nothing dynamic is drawn underneath, the
+    # static layer is always pasted first.
+    def static_key(self):
+        return ()
+
+    def render_static(self):
+        self.clear()
+
+    def draw_static(self):
+        # Paste the cached static layer, rendering it again only when its inputs changed
+        key = self.static_key()
+        if self._static is None or key != self._static_key:
+            self.render_static()
+            self._static = self._image.copy()
+            self._static_key = key
+            metrics.incr("views.static_renders")
+        else:
+            self._image.paste(self._static)
+
+    def icon(self, icon, position, color, rotation=0):
+        if self._palette:
+            self._draw.bitmap(position, sprites.binary(icon, rotation), fill=color)
+            return
+        tile, mask = sprites.get(icon, rotation, color)
+        self._image.paste(tile, position, mask=mask)
+
+    def text(self, position, text, font=None, fill=COLOR_WHITE):
+        if self._palette:
+            left, top, mask = text_cache.binary(font or self.font, text)
+            self._draw.bitmap((position[0] + left, position[1] + top), mask, fill=fill)
+            return
+        text_cache.draw(self._image, position, text, font or self.font, fill)
 
     def label(self, position="X", text=None, bgcolor=(0, 0, 0), textcolor=(255, 255, 255), margin=4):
         if position not in ["A", "B", "X", "Y"]:
             raise ValueError(f"Invalid label position {position}")
 
-        text_w, text_h = self._draw.textsize(text, font=self.font)
+        text_w, text_h = text_cache.size(self.font, text)
         text_h, text_w = 11, text_w + margin * 2 + 2
 
         x, y = {"A": (0, 0), "B": (0, DISPLAY_HEIGHT - text_h), "X": (DISPLAY_WIDTH - text_w, 0), "Y": (DISPLAY_WIDTH - text_w, DISPLAY_HEIGHT - text_h)}[position]
         x2, y2 = x + text_w, y + text_h
 
         self._draw.rectangle((x, y, x2, y2), bgcolor)
-        self._draw.text((x + margin, y + margin - 1), text, font=self.font, fill=textcolor)
+        self.text((x + margin, y + margin - 1), text, fill=textcolor)
 
     def overlay(self, text, top=0):
         self._draw.rectangle((0, top, DISPLAY_WIDTH, DISPLAY_HEIGHT), fill=(192, 225, 254))
@@ -78,78 +484,85 @@ class View:
         self.text_in_rect(text, self.font, (3, top, DISPLAY_WIDTH - 3, DISPLAY_HEIGHT - 2), line_spacing=1)
 
     def text_in_rect(self, text, font, rect, line_spacing=1.1, textcolor=(0, 0, 0)):
-        x1, y1, x2, y2 = rect
-        width, height = x2 - x1, y2 - y1
-
-        while font.size > 0:
-            space_width = font.getsize(" ")[0]
-            line_height = int(font.size * line_spacing)
-            max_lines = math.floor(height / line_height)
-            lines = []
-            words = text.split(" ")
-
-            while len(lines) < max_lines and len(words) > 0:
-                line = []
-                while len(words) > 0 and font.getsize(" ".join(line + [words[0]]))[0] <= width:
-                    line.append(words.pop(0))
-                lines.append(" ".join(line))
+        fitted = layouts.get(text, font, rect, line_spacing)
+        if fitted is None:
+            return None
 
-            if len(lines) <= max_lines and len(words) == 0:
-                y = int(y1 + (height / 2) - (len(lines) * line_height / 2) - (line_height - font.size) / 2)
-                bounds = [x2, y, x1, y + len(lines) * line_height]
-
-                for line in lines:
-                    line_width = font.getsize(line)[0]
-                    x = int(x1 + (width / 2) - (line_width / 2))
-                    bounds[0] = min(bounds[0], x)
-                    bounds[2] = max(bounds[2], x + line_width)
-                    self._draw.text((x, y), line, font=self.font, fill=textcolor)
-                    y += line_height
-                return tuple(bounds)
-
-            font = ImageFont.truetype(font.path, font.size - 1)
+        font, lines, bounds = fitted
+        for x, y, line in lines:
+            self.text((x, y), line, font=font, fill=textcolor)
+        return bounds
 
 class MainView(View):
     def __init__(self, image, channels=None, alarm=None):
         super().__init__(image)
         self.channels = channels
         self.alarm = alarm
+        self._page = 0
+
+    def page(self):
+        # Visible page and the layout, the page wraps if channels were removed
+        layout = bar_layouts.get(len(self.channels))
+        return self._page % layout[2], layout
 
-    def render_channel(self, channel):
-        bar_x = 33
-        bar_margin = 2
-        bar_width = 30
+    def static_key(self):
+        page, (bar_width, per_page, pages, xs) = self.page()
+        return (page, pages)
+
+    def render_channel(self, channel, x, bar_width):
         label_width = 16
         label_y = 0
 
-        x = [bar_x, bar_x + ((bar_width + bar_margin) * 1), bar_x + ((bar_width + bar_margin) * 2)][channel.channel - 1]
-        saturation = channel.sensor.saturation
-        active = channel.sensor.active and channel.enabled
+        saturation = channel.saturation
+        active = channel.active and channel.enabled
         warn_level = channel.warn_level
 
         if active:
-            self._draw.rectangle((x, int((1.0 - saturation) * DISPLAY_HEIGHT), x + bar_width - 1, DISPLAY_HEIGHT),
-                                 channel.indicator_color(saturation) if active else (229, 229, 229))
+            self._draw.rectangle((x, int((1.0 - saturation) * DISPLAY_HEIGHT), x + bar_width - 1, DISPLAY_HEIGHT), channel.lut_color(saturation, PALETTE_STEP if self._palette else 1))
 
         y = int((1.0 - warn_level) * DISPLAY_HEIGHT)
         self._draw.rectangle((x, y, x + bar_width - 1, y), (255, 0, 0) if channel.alarm else (0, 0, 0))
 
         x += (bar_width - label_width) // 2
         self.icon(icon_channel, (x, label_y), (200, 200, 200) if active else (64, 64, 64))
-        tw, th = self.font.getsize(str(channel.channel))
-        self._draw.text((x + int(math.ceil(8 - (tw / 2.0))), label_y + 1), str(channel.channel), font=self.font,
-                        fill=(55, 55, 55) if active else (100, 100, 100))
+        tw, th = text_cache.size(self.font, str(channel.channel))
+        self.text((x + int(math.ceil(8 - (tw / 2.0))), label_y + 1), str(channel.channel),
+                  fill=(55, 55, 55) if active else (100, 100, 100))
 
-    def render(self):
+    def animating(self):
+        return self.alarm is not None and self.alarm.animating()
+
+    def render_alarm(self, position):
+        x, y = position
+        r = 129
+        if self.alarm.animating():
+            r = pulse()
+
+        if self.alarm.sleeping():
+            self.icon(icon_snooze, (x, y - 1), (r, 129, 129))
+        else:
+            self.icon(icon_alarm, (x, y - 1), (r, 129, 129))
+
+    def render_static(self):
         self.clear()
-        for channel in self.channels:
-            self.render_channel(channel)
         self.icon(icon_backdrop, (0, 0), COLOR_WHITE)
         self.icon(icon_rightarrow, (3, 3), (55, 55, 55))
-        self.alarm.render((3, DISPLAY_HEIGHT - 23))
-        self.icon(icon_backdrop.rotate(180), (DISPLAY_WIDTH - 26, 0), COLOR_WHITE)
+        self.icon(icon_backdrop, (DISPLAY_WIDTH - 26, 0), COLOR_WHITE, rotation=180)
         self.icon(icon_settings, (DISPLAY_WIDTH - 19 - 3, 3), (55, 55, 55))
 
+        page, (bar_width, per_page, pages, xs) = self.page()
+        if pages > 1:
+            self.label("Y", f"{page + 1}/{pages}", textcolor=COLOR_BLACK, bgcolor=COLOR_WHITE)
+
+    def render(self):
+        self.draw_static()
+        # Only the channels on the visible page are drawn
+        page, (bar_width, per_page, pages, xs) = self.page()
+        first = page * per_page
+        for x, channel in zip(xs, self.channels[first:first + per_page]):
+            self.render_channel(channel, x, bar_width)
+        self.render_alarm((3, DISPLAY_HEIGHT - 23))
+
     def button_a(self):
         return False
 
@@ -160,7 +573,12 @@ class MainView(View):
         return False
 
     def button_y(self):
-        return False
+        # Next page of channels, when they don't all fit
+        page, (bar_width, per_page, pages, xs) = self.page()
+        if pages == 1:
+            return False
+        self._page = (page + 1) % pages
+        return True
 
 class EditView(View):
     def __init__(self, image, options=[]):
@@ -171,16 +589,16 @@ class EditView(View):
         self._help_mode = False
         self.channel = None
 
-    def render(self):
-        self.icon(icon_backdrop.rotate(180), (DISPLAY_WIDTH - 26, 0), COLOR_WHITE)
+    def static_key(self):
+        # The help overlay covers the option text, so in help mode the whole screen is static
+        return (self._current_option, self._change_mode, self._help_mode)
+
+    def render_static(self):
+        self.clear()
+        self.icon(icon_backdrop, (DISPLAY_WIDTH - 26, 0), COLOR_WHITE, rotation=180)
         self.icon(icon_return, (DISPLAY_WIDTH - 19 - 3, 3), (55, 55, 55))
 
         option = self._options[self._current_option]
-        title = option["title"]
-        prop = option["prop"]
-        obj = option.get("object", self.channel)
-        value = getattr(obj, prop)
-        text = option["format"](value)
         mode = option.get("mode", "int")
         help_text = option["help"]
 
@@ -191,15 +609,26 @@ class EditView(View):
             self.label("B", "Next", textcolor=COLOR_BLACK, bgcolor=COLOR_WHITE)
             self.label("Y", "Change", textcolor=COLOR_BLACK, bgcolor=COLOR_WHITE)
 
-        self._draw.text((3, 36), f"{title} : {text}", font=self.font, fill=COLOR_WHITE)
-
         if self._help_mode:
-            self.icon(icon_backdrop.rotate(90), (0, 0), COLOR_BLUE)
+            self.icon(icon_backdrop, (0, 0), COLOR_BLUE, rotation=90)
             self._draw.rectangle((7, 3, 23, 19), COLOR_BLACK)
             self.overlay(help_text, top=26)
 
         self.icon(icon_help, (0, 0), COLOR_BLUE)
 
+    def render(self):
+        self.draw_static()
+
+        if not self._help_mode:
+            option = self._options[self._current_option]
+            title = option["title"]
+            prop = option["prop"]
+            obj = option.get("object", self.channel)
+            value = getattr(obj, prop)
+            text = option["format"](value)
+
+            self.text((3, 36), f"{title} : {text}")
+
     def button_a(self):
         self._help_mode = not self._help_mode
         return True
@@ -268,10 +697,9 @@ class SettingsView(EditView):
     def __init__(self, image, options=[]):
         super().__init__(image, options)
 
-    def render(self):
-        self.clear()
-        self._draw.text((28, 5), "Settings", font=self.font, fill=COLOR_WHITE)
-        super().render()
+    def render_static(self):
+        super().render_static()
+        self.text((28, 5), "Settings")
 
 class ChannelView(View):
     def __init__(self, image, channel=None):
@@ -279,14 +707,14 @@ class ChannelView(View):
         self.channel = channel
 
     def draw_status(self, position):
-        status = f"Sat: {self.channel.sensor.saturation * 100:.2f}%"
-        self._draw.text(position, status, font=self.font, fill=(255, 255, 255))
+        status = f"Sat: {self.channel.saturation * 100:.2f}%"
+        self.text(position, status)
 
     def draw_context(self, position, metric="Hz"):
-        context = f"Now: {self.channel.sensor.moisture:.2f}Hz"
+        context = f"Now: {self.channel.moisture:.2f}Hz"
         if metric.lower() == "sat":
-            context = f"Now: {self.channel.sensor.saturation * 100:.2f}%"
-        self._draw.text(position, context, font=self.font, fill=(255, 255, 255))
+            context = f"Now: {self.channel.saturation * 100:.2f}%"
+        self.text(position, context)
 
     def button_a(self):
         return False
@@ -301,47 +729,111 @@ class ChannelView(View):
         return False
 
 class DetailView(ChannelView):
-    def render(self):
+    graph_height = DISPLAY_HEIGHT - 8 - 20
+    graph_width = DISPLAY_WIDTH - 64
+    graph_x = (DISPLAY_WIDTH - graph_width) // 2
+    graph_y = 8
+    graph_rows = numpy.arange(graph_height + 1)[:, None]
+    graph_own = numpy.append(numpy.arange(graph_width), 255)
+    graph_left = numpy.insert(numpy.arange(graph_width), 0, 255)
+
+    def __init__(self, image, channel=None, channels=None):
+        super().__init__(image, channel)
+        self.channels = channels
+
+    def tabs(self):
+        # Label x positions of the channels on this channel's home page, and
+        # this channel's own. Without a channel list, channel numbers are positions.
+        if self.channels is None:
+            count, index = max(3, self.channel.channel), self.channel.channel - 1
+        else:
+            count, index = len(self.channels), self.channels.index(self.channel)
+        bar_width, per_page, pages, xs = bar_layouts.get(count)
+        offset = (bar_width - 16) // 2
+        first = index // per_page * per_page
+        tabs = tuple(x + offset for x in xs[:min(per_page, count - first)])
+        return tabs, tabs[index - first]
+
+    def static_key(self):
+        return (self.channel.channel, self.channel.enabled, self.tabs())
+
+    def animating(self):
+        # The alarm line pulses
+        return self.channel.enabled and self.channel.alarm
+
+    def render_static(self):
         self.clear()
         if self.channel.enabled:
-            graph_height = DISPLAY_HEIGHT - 8 - 20
-            graph_width = DISPLAY_WIDTH - 64
-            graph_x = (DISPLAY_WIDTH - graph_width) // 2
-            graph_y = 8
+            self._draw.rectangle((self.graph_x, self.graph_y, self.graph_x + self.graph_width, self.graph_y + self.graph_height), (50, 50, 50))
+
+        tabs, label_x = self.tabs()
+        for x in tabs:
+            self.icon(icon_channel, (x, -10), (16, 16, 16))
+
+    def draw_graph(self):
+        # History columns, newest on the right, drawn in one go as a palette
+        # image whose pixel values are graph columns, 255 is left untouched.
+        # Each column used to be a rectangle two pixels wide, so the column
+        # left of it (older) covers the lower part of its right half.
+        graph_width, graph_height = self.graph_width, self.graph_height
+        values = numpy.asarray(self.channel.sensor.history[:graph_width], dtype=float)[::-1]
+        first = graph_width - len(values)
+
+        # tops[c + 1] is the top row of the column drawn at c, graph_height + 1 for none
+        tops = numpy.full(graph_width + 2, graph_height + 1)
+        tops[first + 1:graph_width + 1] = ((self.graph_y + graph_height) - values * graph_height).astype(int) - self.graph_y
+        lut = self.channel.color_lut()
+        colors = self.channel.color_index(values, PALETTE_STEP if self._palette else 1)
+
+        rows = self.graph_rows
+        index = numpy.where(rows >= tops[:-1], self.graph_left, numpy.where(rows >= tops[1:], self.graph_own, 255)).astype(numpy.uint8)
+        mask = Image.fromarray(index != 255)
+
+        if self._palette:
+            # Map columns to the canvas palette, a handful of quantized colors
+            columns = numpy.zeros(256, dtype=numpy.uint8)
+            for color in numpy.unique(colors):
+                columns[first:graph_width][colors == color] = self._image.palette.getcolor(tuple(int(c) for c in lut[color]), self._image)
+            self._image.paste(Image.fromarray(columns[index], "P"), (self.graph_x, self.graph_y), mask)
+            return
+
+        palette = numpy.zeros((256, 3), dtype=numpy.uint8)
+        palette[first:graph_width] = lut[colors]
+        layer = Image.fromarray(index, "P")
+        layer.putpalette(palette.tobytes())
+        self._image.paste(layer.convert("RGB"), (self.graph_x, self.graph_y), mask)
 
-            self.draw_status((graph_x, graph_y + graph_height + 4))
-            self._draw.rectangle((graph_x, graph_y, graph_x + graph_width, graph_y + graph_height), (50, 50, 50))
+    def render(self):
+        self.draw_static()
+        if self.channel.enabled:
+            graph_height = self.graph_height
+            graph_width = self.graph_width
+            graph_x = self.graph_x
+            graph_y = self.graph_y
 
-            for x, value in enumerate(self.channel.sensor.history[:graph_width]):
-                color = self.channel.indicator_color(value)
-                h = value * graph_height
-                x = graph_x + graph_width - x - 1
-                self._draw.rectangle((x, graph_y + graph_height - h, x + 1, graph_y + graph_height), color)
+            self.draw_status((graph_x, graph_y + graph_height + 4))
+            self.draw_graph()
 
             alarm_line = int(self.channel.warn_level * graph_height)
             r = 255
             if self.channel.alarm:
-                r = int(((math.sin(time.time() * 3 * math.pi) + 1.0) / 2.0) * 128) + 127
+                r = pulse()
 
             self._draw.rectangle((0, graph_height + 8 - alarm_line, DISPLAY_WIDTH - 40, graph_height + 8 - alarm_line), (r, 0, 0))
             self._draw.rectangle((DISPLAY_WIDTH - 20, graph_height + 8 - alarm_line, DISPLAY_WIDTH, graph_height + 8 - alarm_line), (r, 0, 0))
             self.icon(icon_alarm, (DISPLAY_WIDTH - 40, graph_height + 8 - alarm_line - 10), (r, 0, 0))
 
-        x_positions = [40, 72, 104]
-        label_x = x_positions[self.channel.channel - 1]
+        tabs, label_x = self.tabs()
         label_y = 0
-        active = self.channel.sensor.active and self.channel.enabled
-
-        for x in x_positions:
-            self.icon(icon_channel, (x, label_y - 10), (16, 16, 16))
+        active = self.channel.active and self.channel.enabled
 
         self.icon(icon_channel, (label_x, label_y), (200, 200, 200))
-        tw, th = self.font.getsize(str(self.channel.channel))
-        self._draw.text((label_x + int(math.ceil(8 - (tw / 2.0))), label_y + 1), str(self.channel.channel), font=self.font, fill=(55, 55, 55) if active else (100, 100, 100))
+        tw, th = text_cache.size(self.font, str(self.channel.channel))
+        self.text((label_x + int(math.ceil(8 - (tw / 2.0))), label_y + 1), str(self.channel.channel), fill=(55, 55, 55) if active else (100, 100, 100))
 
         self.icon(icon_backdrop, (0, 0), COLOR_WHITE)
         self.icon(icon_rightarrow, (3, 3), (55, 55, 55))
-        self.icon(icon_backdrop.rotate(180), (DISPLAY_WIDTH - 26, 0), COLOR_WHITE)
+        self.icon(icon_backdrop, (DISPLAY_WIDTH - 26, 0), COLOR_WHITE, rotation=180)
         self.icon(icon_settings, (DISPLAY_WIDTH - 19 - 3, 3), (55, 55, 55))
 
 class ChannelEditView(ChannelView, EditView):
@@ -357,11 +849,23 @@ class ChannelEditView(ChannelView, EditView):
             {"title": "Pump Speed", "prop": "pump_speed", "inc": 0.05, "min": 0.05, "max": 1.0, "mode": "float", "round": 2, "format": lambda value: f"{value*100:0.0f}%", "help": "Speed of pump"},
             {"title": "Watering Delay", "prop": "watering_delay", "inc": 10, "min": 30, "max": 500, "mode": "int", "format": lambda value: f"{value:0.0f}sec", "help": "Delay between waterings"},
         ]
-        super().__init__(image, options)
+        EditView.__init__(self, image, options)
         self.channel = channel
 
+    # ChannelView's no-op buttons come first in the MRO, the editor's have to win
+    def button_a(self):
+        return EditView.button_a(self)
+
+    def button_b(self):
+        return EditView.button_b(self)
+
+    def button_x(self):
+        return EditView.button_x(self)
+
+    def button_y(self):
+        return EditView.button_y(self)
+
     def render(self):
-        self.clear()
         super().render()
         option = self._options[self._current_option]
         if "context" in option: